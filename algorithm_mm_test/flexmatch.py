@@ -0,0 +1,288 @@
+"""Local FlexMatch stand-in, to run and load test matchmaking offline.
+
+Takes the RuleSetBody of MatchmakingRuleSet in matchmaking.yaml: teams of
+single player tickets, a batchDistance rule and expansions of its
+maxDistance over the wait time. start_matchmaking, stop_matchmaking and
+describe_matchmaking take the same arguments as the boto3 gamelift client, and
+the events go to a listener shaped like the SNS messages mm_onmatchfound and
+mm_onticketdropped receive (sns_event wraps one for a handler).
+
+Waiting tickets are kept sorted by skill. A set of tickets can be matched
+when its skill spread is within the maxDistance of one of them, and if any
+set can, so can some run of consecutive tickets of the index. The engine
+keeps no such run waiting, so a new ticket or an expansion only has to check
+the runs around one position.
+
+A min-heap of the tickets' next deadline (an expansion or the timeout) lets
+a tick touch only the tickets whose rules change, O(k log n) for k of them
+instead of scanning all n waiting tickets.
+"""
+import bisect
+import heapq
+import itertools
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+class RuleSet:
+    def __init__(self, body):
+        rule_set = json.loads(body) if isinstance(body, str) else body
+
+        self.teams = []
+        for team in rule_set['teams']:
+            if team.get('minPlayers', 1) != team['maxPlayers']:
+                raise ValueError(f"Team {team['name']}: only fixed size teams are supported")
+            quantity = team.get('quantity', 1)
+            for i in range(quantity):
+                name = f"{team['name']}_{i + 1}" if quantity > 1 else team['name']
+                self.teams += [name] * team['maxPlayers']
+        self.match_size = len(self.teams)
+
+        self.defaults = {a['name']: a.get('default') for a in rule_set.get('playerAttributes', [])}
+
+        rules = rule_set.get('rules', [])
+        if len(rules) != 1 or rules[0]['type'] != 'batchDistance':
+            raise ValueError("Only a single batchDistance rule is supported")
+        self.rule = rules[0]['name']
+        self.attribute = rules[0]['batchAttribute']
+        self.max_distance = rules[0]['maxDistance']
+
+        # (wait time, maxDistance) steps, the base value first
+        self.steps = [(0, self.max_distance)]
+        for expansion in rule_set.get('expansions', []):
+            if expansion['target'] != f"rules[{self.rule}].maxDistance":
+                raise ValueError(f"Unsupported expansion target {expansion['target']}")
+            self.steps += sorted((s['waitTimeSeconds'], s['value']) for s in expansion['steps'])
+
+    def skill(self, player):
+        attribute = player.get('PlayerAttributes', {}).get(self.attribute)
+        if attribute is not None:
+            return float(attribute['N'])
+        if self.defaults.get(self.attribute) is not None:
+            return float(self.defaults[self.attribute])
+        raise ValueError(f"Player {player['PlayerId']} has no {self.attribute}")
+
+
+# The rule set and request timeout of the MatchmakingConfiguration in a template
+def load_configuration(path):
+    with open(path) as f:
+        template = f.read()
+
+    body = re.search(r"RuleSetBody: '(.*?)'\n", template, re.DOTALL).group(1)
+    timeout = re.search(r"RequestTimeoutSeconds: (\d+)", template)
+    return RuleSet(body), int(timeout.group(1)) if timeout else 300
+
+
+class Ticket:
+    __slots__ = ('ticket_id', 'players', 'skill', 'start_time', 'step', 'limit', 'next_expansion')
+
+    def __init__(self, ticket_id, players, skill, start_time, rule_set):
+        self.ticket_id = ticket_id
+        self.players = players
+        self.skill = skill
+        self.start_time = start_time
+        self.step = 0
+        self.limit = rule_set.steps[0][1]
+        self.next_expansion = start_time + rule_set.steps[1][0] if len(rule_set.steps) > 1 else None
+
+
+def timestamp(now):
+    return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def sns_event(message):
+    """Lambda event of an SNS notification carrying message."""
+    return {'Records': [{'EventSource': 'aws:sns', 'Sns': {'Type': 'Notification', 'Message': json.dumps(message)}}]}
+
+
+class LocalFlexMatch:
+    def __init__(self, rule_set, configuration_name='local', request_timeout=300, listener=None, clock=time.time):
+        self.rule_set = rule_set
+        self.configuration_name = configuration_name
+        self.request_timeout = request_timeout
+        self.listener = listener
+        self.clock = clock
+        # waiting tickets sorted by skill, skills is kept alongside for bisect
+        self.skills = []
+        self.entries = []
+        self.tickets = {}
+        # (deadline, order, ticket), entries of tickets no longer waiting are dropped when they come up
+        self.deadlines = []
+        self.order = itertools.count()
+        self.matched = 0
+        self.timed_out = 0
+
+    # boto3 gamelift client API
+
+    def start_matchmaking(self, TicketId=None, ConfigurationName=None, Players=()):
+        now = self.clock()
+        ticket_id = TicketId or str(uuid.uuid4())
+        if ticket_id in self.tickets:
+            raise ValueError(f"Ticket {ticket_id} already exists")
+
+        try:
+            if len(Players) != 1:
+                raise ValueError("Only single player tickets are supported")
+            ticket = Ticket(ticket_id, list(Players), self.rule_set.skill(Players[0]), now, self.rule_set)
+        except (ValueError, KeyError) as e:
+            self.emit(self.event('MatchmakingFailed', [(ticket_id, Players, now)], now,
+                                 reason='UnexpectedError', message=str(e)))
+            return {'MatchmakingTicket': {'TicketId': ticket_id, 'Status': 'FAILED'}}
+
+        self.tickets[ticket_id] = ticket
+        i = bisect.bisect_right(self.skills, ticket.skill)
+        self.skills.insert(i, ticket.skill)
+        self.entries.insert(i, ticket)
+        self.settle(i, now)
+        if ticket_id in self.tickets:
+            self.schedule(ticket)
+        return {'MatchmakingTicket': {'TicketId': ticket_id, 'Status': 'SEARCHING' if ticket_id in self.tickets else 'COMPLETED'}}
+
+    def stop_matchmaking(self, TicketId):
+        ticket = self.tickets.get(TicketId)
+        if ticket is None:
+            raise ValueError(f"Ticket {TicketId} is not searching")
+
+        self.remove(ticket)
+        now = self.clock()
+        self.emit(self.event('MatchmakingCancelled', [ticket], now, reason='Cancelled',
+                             message='Cancelled by request.'))
+        return {}
+
+    def describe_matchmaking(self, TicketIds):
+        return {'TicketList': [
+            {'TicketId': t.ticket_id, 'Status': 'SEARCHING', 'StartTime': t.start_time, 'Players': t.players}
+            for t in (self.tickets.get(i) for i in TicketIds) if t is not None
+        ]}
+
+    # expansions and timeouts, to call about every second
+
+    def tick(self):
+        now = self.clock()
+        deadlines = self.deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, _, ticket = heapq.heappop(deadlines)
+            if self.tickets.get(ticket.ticket_id) is not ticket:
+                # matched or cancelled since it was scheduled
+                continue
+
+            # the same sums as schedule, now - start_time can round below a deadline that is due
+            if now >= ticket.start_time + self.request_timeout:
+                self.remove(ticket)
+                self.timed_out += 1
+                self.emit(self.event('MatchmakingTimedOut', [ticket], now, reason='TimedOut',
+                                     message='Removed from matchmaking due to timing out.'))
+                continue
+
+            self.expand(ticket, now)
+            self.settle(self.index_of(ticket), now)
+            if self.tickets.get(ticket.ticket_id) is ticket:
+                self.schedule(ticket)
+
+        # most tickets match before their first deadline, do not let their entries pile up
+        if len(deadlines) > 2 * len(self.tickets) + 1024:
+            self.deadlines = [entry for entry in deadlines if self.tickets.get(entry[2].ticket_id) is entry[2]]
+            heapq.heapify(self.deadlines)
+
+    def schedule(self, ticket):
+        deadline = ticket.start_time + self.request_timeout
+        if ticket.next_expansion is not None and ticket.next_expansion < deadline:
+            deadline = ticket.next_expansion
+        heapq.heappush(self.deadlines, (deadline, next(self.order), ticket))
+
+    def expand(self, ticket, now):
+        steps = self.rule_set.steps
+        while ticket.step + 1 < len(steps) and ticket.start_time + steps[ticket.step + 1][0] <= now:
+            ticket.step += 1
+        ticket.limit = steps[ticket.step][1]
+        ticket.next_expansion = ticket.start_time + steps[ticket.step + 1][0] if ticket.step + 1 < len(steps) else None
+
+    # index
+
+    def index_of(self, ticket):
+        i = bisect.bisect_left(self.skills, ticket.skill)
+        while self.entries[i] is not ticket:
+            i += 1
+        return i
+
+    def remove(self, ticket):
+        i = self.index_of(ticket)
+        del self.skills[i]
+        del self.entries[i]
+        del self.tickets[ticket.ticket_id]
+
+    # Best matchable run of match_size tickets starting in [first, last], as (spread, start)
+    def best_window(self, first, last):
+        k = self.rule_set.match_size
+        skills = self.skills
+        first = max(first, 0)
+        last = min(last, len(skills) - k)
+        best = None
+        for start in range(first, last + 1):
+            spread = skills[start + k - 1] - skills[start]
+            if best is not None and spread >= best[0]:
+                continue
+            if spread <= max(e.limit for e in self.entries[start:start + k]):
+                best = (spread, start)
+        return best
+
+    # Match the runs through position i, then the runs across each gap that leaves
+    def settle(self, i, now):
+        k = self.rule_set.match_size
+        best = self.best_window(i - k + 1, i)
+        while best is not None:
+            start = best[1]
+            tickets = self.entries[start:start + k]
+            del self.skills[start:start + k]
+            del self.entries[start:start + k]
+            for ticket in tickets:
+                del self.tickets[ticket.ticket_id]
+            self.matched += 1
+            self.emit(self.succeeded(tickets, now))
+            best = self.best_window(start - k + 1, start - 1)
+
+    # events
+
+    def emit(self, message):
+        if self.listener is not None:
+            self.listener(message)
+
+    def event(self, event_type, tickets, now, **detail):
+        entries = []
+        for ticket in tickets:
+            if isinstance(ticket, Ticket):
+                ticket = (ticket.ticket_id, ticket.players, ticket.start_time)
+            ticket_id, players, start_time = ticket
+            entries.append({
+                'ticketId': ticket_id,
+                'startTime': timestamp(start_time),
+                'players': [{'playerId': p.get('PlayerId')} for p in players]
+            })
+
+        detail.update({
+            'tickets': entries,
+            'type': event_type,
+            'matchmakingConfigurationArn': self.configuration_name
+        })
+        return {
+            'version': '0',
+            'id': str(uuid.uuid4()),
+            'detail-type': 'GameLift Matchmaking Event',
+            'source': 'aws.gamelift',
+            'time': timestamp(now),
+            'resources': [self.configuration_name],
+            'detail': detail
+        }
+
+    def succeeded(self, tickets, now):
+        message = self.event('MatchmakingSucceeded', tickets, now, matchId=str(uuid.uuid4()))
+        players = []
+        for entry, team in zip(message['detail']['tickets'], self.rule_set.teams):
+            for player in entry['players']:
+                player['team'] = team
+                players.append({'playerId': player['playerId'], 'team': team})
+        message['detail']['gameSessionInfo'] = {'players': players}
+        return message
@@ -0,0 +1,153 @@
+import bisect
+import heapq
+import itertools
+
+# players per block of the sorted index, a block is split past twice that
+BLOCK_SIZE = 512
+
+
+class IncrementalGroups:
+    """Groups of group_size players within max_distance, kept up to date as players come and go.
+
+    Players are kept sorted by skill, and the candidate groups are the runs of
+    group_size consecutive players, in a min-heap by spread (max - min skill).
+    Adding or removing a player only pushes the runs around its position: the
+    runs it breaks stay in the heap and are dropped when they come up. groups()
+    takes the best runs with a spread within max_distance, so a tick costs
+    O((churn + groups) * group_size * log n) whatever the number of waiting
+    players. max_distance can change between ticks.
+
+    The sorted index is a list of blocks of at most 2 * BLOCK_SIZE players, so
+    that an insert or a delete moves a block and not the whole queue.
+    """
+
+    def __init__(self, group_size, max_distance):
+        self.group_size = group_size
+        self.max_distance = max_distance
+        # sorted (skill, order, player id), order breaks ties
+        self.blocks = []
+        # last key of each block, for bisect
+        self.maxes = []
+        self.key_of = {}
+        # (spread, order, keys of the run), keys and not ids so a player added again breaks the run
+        self.candidates = []
+        self.order = itertools.count()
+
+    def __len__(self):
+        return len(self.key_of)
+
+    def __iter__(self):
+        for block in self.blocks:
+            for key in block:
+                yield key[2]
+
+    def add(self, player_id, skill):
+        if player_id in self.key_of:
+            raise ValueError(f"Player {player_id} is already waiting")
+
+        key = (skill, next(self.order), player_id)
+        self.key_of[player_id] = key
+        self.insert(key)
+        b, i = self.position(key)
+        self.push_runs(*self.around(b, i, self.group_size - 1, self.group_size))
+
+    def remove(self, player_id):
+        key = self.key_of.pop(player_id)
+        self.delete(key)
+        self.push_gap(key)
+
+    def groups(self):
+        """Take the groups within max_distance, the smallest spread first, as lists of player ids."""
+        k = self.group_size
+        groups = []
+        while self.candidates and self.candidates[0][0] <= self.max_distance:
+            _, _, run = heapq.heappop(self.candidates)
+            if self.key_of.get(run[0][2]) != run[0]:
+                continue
+            _, keys = self.around(*self.position(run[0]), 0, k)
+            if tuple(keys) != run:
+                # a player of the run left, came back or one came in between
+                continue
+
+            groups.append([key[2] for key in run])
+            for key in keys:
+                del self.key_of[key[2]]
+                self.delete(key)
+            self.push_gap(keys[0])
+
+        # most runs get broken before they come up, do not let them pile up
+        if len(self.candidates) > 2 * len(self.key_of) + 1024:
+            self.candidates = []
+            for block in self.blocks:
+                self.push_runs([], block)
+            # and the runs across the blocks
+            for b in range(1, len(self.blocks)):
+                self.push_runs(*self.around(b, 0, k - 1, k - 1))
+        return groups
+
+    # sorted index
+
+    def position(self, key):
+        b = bisect.bisect_left(self.maxes, key)
+        if b == len(self.blocks):
+            # past the end
+            return (b - 1, len(self.blocks[b - 1])) if self.blocks else (0, 0)
+        return b, bisect.bisect_left(self.blocks[b], key)
+
+    def insert(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+
+        b = min(bisect.bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[b]
+        bisect.insort(block, key)
+        self.maxes[b] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            self.blocks[b:b + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self.maxes[b:b + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+
+    def delete(self, key):
+        b, i = self.position(key)
+        block = self.blocks[b]
+        del block[i]
+        if block:
+            self.maxes[b] = block[-1]
+        else:
+            del self.blocks[b]
+            del self.maxes[b]
+
+    # Up to before keys ahead of position (b, i) and up to after keys from it on
+    def around(self, b, i, before, after):
+        left = []
+        lb, li = b, i
+        while len(left) < before:
+            if li == 0:
+                lb -= 1
+                if lb < 0:
+                    break
+                li = len(self.blocks[lb])
+            take = min(before - len(left), li)
+            left[:0] = self.blocks[lb][li - take:li]
+            li -= take
+
+        right = []
+        while len(right) < after and b < len(self.blocks):
+            right += self.blocks[b][i:i + after - len(right)]
+            b, i = b + 1, 0
+        return left, right
+
+    # Runs across the gap left where key was
+    def push_gap(self, key):
+        k = self.group_size
+        self.push_runs(*self.around(*self.position(key), k - 1, k - 1))
+
+    # Runs of the keys left + right that are not all in left
+    def push_runs(self, left, right):
+        k = self.group_size
+        keys = left + right
+        for start in range(max(len(left) - k + 1, 0), len(keys) - k + 1):
+            spread = keys[start + k - 1][0] - keys[start][0]
+            run = tuple(keys[start:start + k])
+            heapq.heappush(self.candidates, (spread, next(self.order), run))
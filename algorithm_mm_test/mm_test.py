@@ -1,45 +1,53 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
-def k_means_cluster(k, points):
+from partition import partition, spread
+
+# MMR of player_count players, uniform between min_mmr and max_mmr
+def random_mmr(player_count, min_mmr=1000, max_mmr=1200):
+    return np.random.randint(min_mmr, max_mmr, player_count)
+
+def k_means_cluster(k, points, max_iterations=100):
     # Initialization: choose k centroids (Forgy, Random Partition, etc.)
     centroids = np.random.choice(points, k, replace=False)
 
     # Initialize clusters list
     clusters = [[] for _ in range(k)]
 
-    # Loop until convergence
-    converged = False
-    while not converged:
+    # Loop until convergence, or give up after max_iterations
+    for _ in range(max_iterations):
         # Clear previous clusters
         clusters = [[] for _ in range(k)]
 
         # Assign each point to the "closest" centroid
         for point in points:
             distances_to_each_centroid = [np.abs(point - centroid) for centroid in centroids]
-            cluster_assignment = np.min(distances_to_each_centroid)
+            cluster_assignment = np.argmin(distances_to_each_centroid)
             clusters[cluster_assignment].append(point)
 
         # Calculate new centroids
         #   (the standard implementation uses the mean of all points in a
         #     cluster to determine the new centroid)
-        new_centroids = [np.mean(cluster) for cluster in clusters]
+        #   (an empty cluster keeps its centroid)
+        new_centroids = np.array([np.mean(cluster) if cluster else centroid
+                                  for cluster, centroid in zip(clusters, centroids)])
 
         converged = (new_centroids == centroids).all()
         centroids = new_centroids
 
         if converged:
-            return clusters
+            break
+
+    return clusters
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     # create a bunch of players represented by their MMR and their request start time in s
     player_count = 1000
     min_mmr = 1000
     max_mmr = 1200
 
-    players = []
-    for i in range(0, player_count):
-        players.append(np.random.randint(min_mmr, max_mmr))
+    players = random_mmr(player_count, min_mmr, max_mmr)
 
     # plot players histogram
     plt.hist(players, bins=50)
@@ -61,6 +69,10 @@ if __name__ == '__main__':
     for match in matches:
         print(f'Match average MMR: {np.mean(match)}')
         print('Players:')
-        for player in match[2]:
+        for player in match:
             print(player)
-        print()
\ No newline at end of file
+        print()
+
+    # optimal groups of exactly match_size players
+    groups, unmatched = partition(players, match_size)
+    print(f'Optimal partition: average MMR spread {np.mean(spread(players, groups))}, {len(unmatched)} unmatched')
\ No newline at end of file
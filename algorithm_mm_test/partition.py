@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def partition(values, group_size):
+    """Split players into groups of group_size with the smallest total skill spread.
+
+    The spread of a group is its max minus its min value, and the total over
+    all groups is minimized exactly. In one dimension some optimal solution
+    takes each group as consecutive players of the sorted values, leaving the
+    len(values) % group_size players that do not fit between groups. The
+    dynamic program over that runs in O(n) vectorized steps after the sort.
+
+    Returns (groups, unmatched): an (n // group_size, group_size) array of
+    indices into values, one row per group sorted by skill, and the indices
+    of the players left out.
+    """
+    values = np.asarray(values)
+    n = len(values)
+    g = group_size
+    m = n // g
+    r = n - m * g
+    order = np.argsort(values, kind='stable')
+    if m == 0:
+        return np.empty((0, g), dtype=np.intp), order
+
+    x = values[order].astype(np.float64)
+    # spread of the group starting at each sorted position
+    width = x[g - 1:] - x[:n - g + 1]
+
+    # With s players skipped so far, the players before position s + k * g
+    # form k groups. cost[k] is the best total spread of that state, either
+    # reached by skipping one more player from state (s - 1, k), or by adding
+    # the group starting at s + (k - 1) * g to state (s, k - 1). With P the
+    # prefix sums of those group spreads this is
+    #   cost = P + minimum.accumulate(previous - P)
+    # and origin[k] keeps the state the minimum came from, for backtracking.
+    ks = np.arange(m + 1)
+    previous = np.full(m + 1, np.inf)
+    previous[0] = 0
+    origins = []
+    for s in range(r + 1):
+        prefix = np.zeros(m + 1)
+        np.cumsum(width[s:s + m * g:g], out=prefix[1:])
+        reduced = previous - prefix
+        best = np.minimum.accumulate(reduced)
+        origins.append(np.maximum.accumulate(np.where(reduced == best, ks, 0)))
+        previous = best + prefix
+
+    starts = np.empty(m, dtype=np.intp)
+    skipped = np.empty(r, dtype=np.intp)
+    k = m
+    for s in range(r, -1, -1):
+        j = origins[s][k]
+        starts[j:k] = s + np.arange(j, k) * g
+        if s > 0:
+            skipped[s - 1] = s - 1 + j * g
+        k = j
+
+    groups = order[starts[:, None] + np.arange(g)]
+    return groups, order[skipped]
+
+
+def spread(values, groups):
+    """Skill spread (max - min) of each group."""
+    members = np.asarray(values)[groups]
+    return members.max(axis=1) - members.min(axis=1)
@@ -0,0 +1,252 @@
+"""Local FlexMatch split over worker processes by skill range.
+
+The skill axis is cut at bounds into shards, and every ticket is owned by
+the shard of its skill, each running its own LocalFlexMatch in a worker
+process. A shard keeps no matchable run of its own tickets waiting, so the
+only runs left are those across a bound: the top tickets of one shard and
+the bottom ones of the next. Each shard reports its match_size - 1 lowest and
+highest waiting tickets, and the coordinator matches the runs across the
+bounds and has the owners drop those tickets. A ticket is only ever matched
+by its owner or by the coordinator after the owner removed it, never twice.
+
+start_matchmaking and stop_matchmaking are buffered and sent to the shards by
+the next tick, which runs one round on every worker in parallel. Call it a
+few times a second. The listener is called in the worker process of the
+shard that made the event (the coordinator for the matches across bounds),
+only ticket ids and event types come back to the coordinator.
+"""
+import bisect
+import multiprocessing
+import time
+
+from flexmatch import LocalFlexMatch
+
+
+def quantile_bounds(skills, shards):
+    """Bounds splitting a sample of skills into shards of about the same count."""
+    skills = sorted(skills)
+    return [skills[len(skills) * i // shards] for i in range(1, shards)]
+
+
+# (ticket id, skill, limit, players, start time) of the size lowest and highest waiting tickets
+def edges(engine, size):
+    def entry(ticket):
+        return ticket.ticket_id, ticket.skill, ticket.limit, ticket.players, ticket.start_time
+    low = engine.entries[:size]
+    high = engine.entries[len(engine.entries) - len(low):]
+    return [entry(t) for t in low], [entry(t) for t in high]
+
+
+def shard_worker(connection, rule_set, configuration_name, request_timeout, listener):
+    now = [0.0]
+    # (event type, ticket ids) of the round
+    events = []
+
+    def record(message):
+        detail = message['detail']
+        events.append((detail['type'], [t['ticketId'] for t in detail['tickets']]))
+        if listener is not None:
+            listener(message)
+
+    engine = LocalFlexMatch(rule_set, configuration_name, request_timeout, listener=record,
+                            clock=lambda: now[0])
+    size = rule_set.match_size - 1
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        now[0], removed, stopped, started, tick = message
+        # matched by the coordinator
+        for ticket_id in removed:
+            engine.remove(engine.tickets[ticket_id])
+        for ticket_id in stopped:
+            if ticket_id in engine.tickets:
+                engine.stop_matchmaking(TicketId=ticket_id)
+        round_time = now[0]
+        for ticket_id, players, start_time in started:
+            now[0] = start_time
+            engine.start_matchmaking(TicketId=ticket_id, ConfigurationName=configuration_name, Players=players)
+        now[0] = round_time
+        if tick:
+            engine.tick()
+
+        connection.send((events, edges(engine, size)))
+        events.clear()
+
+
+class ShardedFlexMatch:
+    def __init__(self, rule_set, bounds, configuration_name='local', request_timeout=300, listener=None,
+                 clock=time.time):
+        self.rule_set = rule_set
+        self.bounds = sorted(bounds)
+        self.configuration_name = configuration_name
+        self.listener = listener
+        self.clock = clock
+        # builds the events of the matches across shards
+        self.local = LocalFlexMatch(rule_set, configuration_name, request_timeout)
+
+        self.connections = []
+        self.workers = []
+        for _ in range(len(self.bounds) + 1):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=shard_worker, daemon=True,
+                                             args=(worker_connection, rule_set, configuration_name, request_timeout,
+                                                   listener))
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+        shards = len(self.workers)
+        self.started = [[] for _ in range(shards)]
+        self.stopped = [[] for _ in range(shards)]
+        self.edges = [([], []) for _ in range(shards)]
+        # ticket id -> (shard, players, start time) of the tickets not resolved yet
+        self.waiting = {}
+        # events of tickets not waiting, stays 0
+        self.resolved_twice = 0
+        self.matched = 0
+        self.crossing = 0
+        self.timed_out = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for worker in self.workers:
+            worker.join()
+
+    # boto3 gamelift client API
+
+    def start_matchmaking(self, TicketId, ConfigurationName=None, Players=()):
+        if TicketId in self.waiting:
+            raise ValueError(f"Ticket {TicketId} already exists")
+
+        try:
+            shard = bisect.bisect_right(self.bounds, self.rule_set.skill(Players[0]))
+        except (ValueError, KeyError, IndexError):
+            # the shard engine reports it as failed
+            shard = 0
+        now = self.clock()
+        self.waiting[TicketId] = (shard, list(Players), now)
+        self.started[shard].append((TicketId, list(Players), now))
+        return {'MatchmakingTicket': {'TicketId': TicketId, 'Status': 'QUEUED'}}
+
+    def stop_matchmaking(self, TicketId):
+        if TicketId not in self.waiting:
+            raise ValueError(f"Ticket {TicketId} is not searching")
+
+        shard, players, start_time = self.waiting[TicketId]
+        started = [t for t in self.started[shard] if t[0] != TicketId]
+        if len(started) == len(self.started[shard]):
+            self.stopped[shard].append(TicketId)
+            return {}
+
+        # not sent to the shard yet
+        self.started[shard] = started
+        del self.waiting[TicketId]
+        self.emit(self.local.event('MatchmakingCancelled', [(TicketId, players, start_time)], self.clock(),
+                                   reason='Cancelled', message='Cancelled by request.'))
+        return {}
+
+    def describe_matchmaking(self, TicketIds):
+        return {'TicketList': [
+            {'TicketId': ticket_id, 'Status': 'SEARCHING', 'StartTime': self.waiting[ticket_id][2],
+             'Players': self.waiting[ticket_id][1]}
+            for ticket_id in TicketIds if ticket_id in self.waiting
+        ]}
+
+    # one round on every shard, then the matches across the bounds
+
+    def tick(self):
+        now = self.clock()
+        shards = range(len(self.workers))
+        self.round(now, shards, [[] for _ in shards], tick=True)
+
+        while True:
+            best = self.best_crossing()
+            if best is None:
+                break
+
+            removed = [[] for _ in shards]
+            while best is not None:
+                tickets = best[1]
+                for ticket_id, *_ in tickets:
+                    removed[self.waiting[ticket_id][0]].append(ticket_id)
+                    del self.waiting[ticket_id]
+                self.matched += 1
+                self.crossing += 1
+                self.emit(self.local.succeeded([(t[0], t[3], t[4]) for t in tickets], now))
+                # the edges behind the matched tickets are not known until the owners drop them
+                self.forget(tickets)
+                best = self.best_crossing()
+            self.round(now, [i for i in shards if removed[i]], removed, tick=False)
+
+    def round(self, now, shards, removed, tick):
+        for i in shards:
+            self.connections[i].send((now, removed[i], self.stopped[i], self.started[i], tick))
+            self.stopped[i] = []
+            self.started[i] = []
+        for i in shards:
+            events, self.edges[i] = self.connections[i].recv()
+            for event_type, ticket_ids in events:
+                self.resolve(event_type, ticket_ids)
+
+    def resolve(self, event_type, ticket_ids):
+        for ticket_id in ticket_ids:
+            if self.waiting.pop(ticket_id, None) is None:
+                self.resolved_twice += 1
+        if event_type == 'MatchmakingSucceeded':
+            self.matched += 1
+        elif event_type == 'MatchmakingTimedOut':
+            self.timed_out += len(ticket_ids)
+
+    # Drop matched tickets from the known edges, a shard with an edge matched is skipped until its next report
+    def forget(self, tickets):
+        ids = {t[0] for t in tickets}
+        for i, edge in enumerate(self.edges):
+            if edge is not None and any(t[0] in ids for t in edge[0] + edge[1]):
+                self.edges[i] = None
+
+    # Best matchable run across a bound, as (spread, tickets)
+    def best_crossing(self):
+        k = self.rule_set.match_size
+        if k < 2:
+            return None
+
+        best = None
+        for bound in range(1, len(self.edges)):
+            below = self.side(range(bound - 1, -1, -1), 1, k - 1)
+            above = self.side(range(bound, len(self.edges)), 0, k - 1)
+            if below is None or above is None:
+                continue
+            run = below[::-1] + above
+            for start in range(max(0, len(below) - k + 1), min(len(below), len(run) - k + 1)):
+                window = run[start:start + k]
+                spread = window[-1][1] - window[0][1]
+                if best is not None and spread >= best[0]:
+                    continue
+                if spread <= max(t[2] for t in window):
+                    best = (spread, window)
+        return best
+
+    # Up to count tickets walking the shards away from a bound, closest first, None if an edge is unknown
+    def side(self, shards, end, count):
+        tickets = []
+        for i in shards:
+            if self.edges[i] is None:
+                return None
+            edge = self.edges[i][end]
+            tickets += edge[::-1] if end else edge
+            if len(edge) == count:
+                break
+        return tickets[:count]
+
+    def emit(self, message):
+        if self.listener is not None:
+            self.listener(message)
@@ -0,0 +1,203 @@
+"""Matchmaking simulator: synthetic traffic through the local FlexMatch engine.
+
+Players arrive as a Poisson process, get a skill from the mm_test MMR model
+(uniform) or a normal distribution, and disconnect while waiting at a given
+rate. The engine ticks every tick_interval seconds of simulated time. Reports
+time to match percentiles, skill spread within matches, timeout and
+disconnect rates, and the CPU time of each tick.
+
+Several values of --rate, --max-distance, --steps or --disconnect-rate
+sweep every combination, one simulation per process.
+
+usage: python simulator.py [--rate 20] [--duration 600] [--steps 10:60,20:120,30:9999999]
+"""
+import argparse
+import heapq
+import itertools
+import os
+import random
+import statistics
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from flexmatch import LocalFlexMatch, load_configuration
+from mm_test import random_mmr
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'matchmaking.yaml')
+
+ARRIVAL, TICK, DISCONNECT = 0, 1, 2
+
+
+def parse_steps(text):
+    """'10:60,20:120' -> [(10, 60), (20, 120)]"""
+    return [tuple(float(v) for v in step.split(':')) for step in text.split(',') if step]
+
+
+def skills(model, mean, stddev, min_mmr, max_mmr, block=4096):
+    while True:
+        if model == 'uniform':
+            yield from random_mmr(block, min_mmr, max_mmr).tolist()
+        else:
+            yield from np.random.normal(mean, stddev, block).round().tolist()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def simulate(rate=20, duration=600, max_distance=None, steps=None, disconnect_rate=0.0, request_timeout=None,
+             skill_model='uniform', mean=1100, stddev=150, min_mmr=1000, max_mmr=1200, tick_interval=1.0, seed=0):
+    """Run one simulation, returns its report as a dict.
+
+    max_distance, steps ([(wait, value)]) and request_timeout default to
+    matchmaking.yaml. disconnect_rate is the chance per second that a
+    waiting player leaves. Arrivals stop after duration seconds, then the
+    simulation runs until every ticket is resolved.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+    rule_set, configured_timeout = load_configuration(TEMPLATE)
+    if max_distance is not None:
+        rule_set.steps[0] = (0, max_distance)
+    if steps is not None:
+        rule_set.steps[1:] = sorted(steps)
+    request_timeout = request_timeout or configured_timeout
+
+    now = [0.0]
+    waiting = {}
+    ttm = []
+    spreads = []
+    outcomes = {'matched': 0, 'timed_out': 0, 'disconnected': 0, 'failed': 0}
+
+    def listener(message):
+        detail = message['detail']
+        tickets = [waiting.pop(t['ticketId']) for t in detail['tickets'] if t['ticketId'] in waiting]
+        if detail['type'] == 'MatchmakingSucceeded':
+            ttm.extend(now[0] - arrived for arrived, _ in tickets)
+            match_skills = [skill for _, skill in tickets]
+            spreads.append(max(match_skills) - min(match_skills))
+            outcomes['matched'] += len(tickets)
+        elif detail['type'] == 'MatchmakingTimedOut':
+            outcomes['timed_out'] += len(tickets)
+        elif detail['type'] == 'MatchmakingFailed':
+            outcomes['failed'] += len(tickets)
+
+    engine = LocalFlexMatch(rule_set, request_timeout=request_timeout, listener=listener, clock=lambda: now[0])
+    draw = skills(skill_model, mean, stddev, min_mmr, max_mmr)
+
+    # (time, order, kind, ticket id)
+    events = [(random.expovariate(rate), 0, ARRIVAL, None), (tick_interval, 1, TICK, None)]
+    order = itertools.count(2)
+    arrivals = 0
+    tick_cpu = []
+    cpu_start = time.process_time()
+    while events:
+        now[0], _, kind, ticket_id = heapq.heappop(events)
+        if kind == ARRIVAL:
+            ticket_id = str(arrivals)
+            arrivals += 1
+            skill = next(draw)
+            waiting[ticket_id] = (now[0], skill)
+            engine.start_matchmaking(
+                TicketId=ticket_id,
+                Players=[{'PlayerId': f"player-{ticket_id}", 'PlayerAttributes': {'skill': {'N': skill}}}]
+            )
+            if disconnect_rate > 0 and ticket_id in waiting:
+                heapq.heappush(events, (now[0] + random.expovariate(disconnect_rate), next(order), DISCONNECT, ticket_id))
+            next_arrival = now[0] + random.expovariate(rate)
+            if next_arrival < duration:
+                heapq.heappush(events, (next_arrival, next(order), ARRIVAL, None))
+        elif kind == DISCONNECT:
+            if ticket_id in waiting:
+                del waiting[ticket_id]
+                engine.stop_matchmaking(TicketId=ticket_id)
+                outcomes['disconnected'] += 1
+        else:
+            cpu = time.process_time()
+            engine.tick()
+            tick_cpu.append(time.process_time() - cpu)
+            if now[0] < duration or waiting:
+                heapq.heappush(events, (now[0] + tick_interval, next(order), TICK, None))
+
+    cpu_total = time.process_time() - cpu_start
+    return {
+        'rate': rate,
+        'max_distance': rule_set.steps[0][1],
+        'steps': ','.join(f"{w:g}:{v:g}" for w, v in rule_set.steps[1:]),
+        'disconnect_rate': disconnect_rate,
+        'players': arrivals,
+        'matches': len(spreads),
+        'ttm_p50': percentile(ttm, 50),
+        'ttm_p90': percentile(ttm, 90),
+        'ttm_p99': percentile(ttm, 99),
+        'spread_mean': float(np.mean(spreads)) if spreads else float('nan'),
+        'spread_p90': percentile(spreads, 90),
+        'timeout_rate': outcomes['timed_out'] / arrivals if arrivals else 0.0,
+        'disconnect_share': outcomes['disconnected'] / arrivals if arrivals else 0.0,
+        'tick_cpu_ms_mean': statistics.mean(tick_cpu) * 1000 if tick_cpu else 0.0,
+        'tick_cpu_ms_max': max(tick_cpu) * 1000 if tick_cpu else 0.0,
+        'cpu_s': cpu_total,
+    }
+
+
+def simulate_kwargs(kwargs):
+    return simulate(**kwargs)
+
+
+# report key, header, format
+COLUMNS = [
+    ('rate', 'rate', '{:>8g}'), ('max_distance', 'maxdist', '{:>8g}'), ('steps', 'steps', '{:>26}'),
+    ('disconnect_rate', 'leave/s', '{:>8g}'), ('players', 'players', '{:>8}'),
+    ('ttm_p50', 'ttm p50', '{:>8.1f}'), ('ttm_p90', 'ttm p90', '{:>8.1f}'), ('ttm_p99', 'ttm p99', '{:>8.1f}'),
+    ('spread_mean', 'spread', '{:>8.1f}'), ('spread_p90', 'sprd p90', '{:>9.1f}'),
+    ('timeout_rate', 'timeout', '{:>8.2%}'), ('disconnect_share', 'left', '{:>8.2%}'),
+    ('tick_cpu_ms_mean', 'tick ms', '{:>9.3f}'), ('tick_cpu_ms_max', 'tick max', '{:>9.3f}'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, nargs='+', default=[20], help='player arrivals per second')
+    parser.add_argument('--duration', type=float, default=600, help='seconds of arrivals')
+    parser.add_argument('--max-distance', type=float, nargs='+', default=[None])
+    parser.add_argument('--steps', type=parse_steps, nargs='+', default=[None],
+                        help='expansion steps as wait:value,... (default: matchmaking.yaml)')
+    parser.add_argument('--disconnect-rate', type=float, nargs='+', default=[0.0],
+                        help='chance per second that a waiting player leaves')
+    parser.add_argument('--request-timeout', type=float)
+    parser.add_argument('--skill-model', choices=['uniform', 'normal'], default='uniform')
+    parser.add_argument('--mean', type=float, default=1100)
+    parser.add_argument('--stddev', type=float, default=150)
+    parser.add_argument('--min-mmr', type=int, default=1000)
+    parser.add_argument('--max-mmr', type=int, default=1200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    common = {
+        'duration': args.duration, 'request_timeout': args.request_timeout, 'skill_model': args.skill_model,
+        'mean': args.mean, 'stddev': args.stddev, 'min_mmr': args.min_mmr, 'max_mmr': args.max_mmr,
+        'seed': args.seed,
+    }
+    runs = [
+        dict(common, rate=rate, max_distance=max_distance, steps=steps, disconnect_rate=disconnect_rate)
+        for rate, max_distance, steps, disconnect_rate
+        in itertools.product(args.rate, args.max_distance, args.steps, args.disconnect_rate)
+    ]
+
+    if len(runs) == 1:
+        reports = [simulate(**runs[0])]
+    else:
+        with Pool(min(args.processes, len(runs))) as pool:
+            reports = pool.map(simulate_kwargs, runs)
+
+    print(''.join(f"{header:>{len(fmt.format(reports[0][key]))}}" for key, header, fmt in COLUMNS))
+    for report in reports:
+        print(''.join(fmt.format(report[key]) for key, _, fmt in COLUMNS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from flexmatch import LocalFlexMatch, RuleSet
+
+RULE_SET = {
+    'playerAttributes': [{'name': 'skill', 'type': 'number'}],
+    'teams': [{'name': 'players', 'minPlayers': 2, 'maxPlayers': 2}],
+    'rules': [{'name': 'skill', 'type': 'batchDistance', 'batchAttribute': 'skill', 'maxDistance': 5}],
+    'expansions': [{'target': 'rules[skill].maxDistance', 'steps': [{'waitTimeSeconds': 10, 'value': 50}]}],
+}
+
+
+def engine(now):
+    events = []
+    flexmatch = LocalFlexMatch(RuleSet(RULE_SET), request_timeout=300, listener=events.append, clock=lambda: now[0])
+    return flexmatch, events
+
+
+def start(flexmatch, ticket_id, skill):
+    flexmatch.start_matchmaking(TicketId=ticket_id, Players=[
+        {'PlayerId': ticket_id, 'PlayerAttributes': {'skill': {'N': skill}}}
+    ])
+
+
+# start_time + 300 - start_time rounds below 300, the deadline is due all the same
+def test_timeout_due_with_rounding():
+    start_time = 524177.0708534653
+    assert (start_time + 300) - start_time < 300
+
+    now = [start_time]
+    flexmatch, events = engine(now)
+    start(flexmatch, 'a', 0)
+    now[0] = start_time + 300
+    flexmatch.tick()
+
+    assert not flexmatch.tickets
+    assert [e['detail']['type'] for e in events] == ['MatchmakingTimedOut']
+
+
+def test_expansion_due_with_rounding():
+    start_time = 262142.53864429894
+    assert (start_time + 10) - start_time < 10
+
+    now = [start_time]
+    flexmatch, events = engine(now)
+    start(flexmatch, 'a', 0)
+    start(flexmatch, 'b', 20)
+    now[0] = start_time + 10
+    flexmatch.tick()
+
+    assert not flexmatch.tickets
+    assert [e['detail']['type'] for e in events] == ['MatchmakingSucceeded']
@@ -0,0 +1,40 @@
+import random
+
+from incremental import IncrementalGroups
+
+
+# the run of a and b was pushed with b at 1, b came back at 100
+def test_player_added_again_breaks_run():
+    g = IncrementalGroups(2, 5)
+    g.add('a', 0)
+    g.add('b', 1)
+    g.remove('b')
+    g.add('b', 100)
+    assert g.groups() == []
+
+    g.add('c', 3)
+    assert g.groups() == [['a', 'c']]
+    assert list(g) == ['b']
+
+
+def test_groups_within_max_distance():
+    rng = random.Random(1)
+    g = IncrementalGroups(4, 10)
+    skills = {}
+    for step in range(2000):
+        if skills and rng.random() < 0.3:
+            player = rng.choice(list(skills))
+            g.remove(player)
+            del skills[player]
+        else:
+            player = f"p{rng.randrange(500)}"
+            if player in skills:
+                continue
+            skills[player] = rng.uniform(0, 1000)
+            g.add(player, skills[player])
+
+        for group in g.groups():
+            assert max(skills[p] for p in group) - min(skills[p] for p in group) <= 10
+            for p in group:
+                del skills[p]
+        assert sorted(g) == sorted(skills)
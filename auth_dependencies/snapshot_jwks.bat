@@ -0,0 +1,2 @@
+REM usage: snapshot_jwks.bat <region> <user pool id>
+curl -f -o python\cognito_jwks.json https://cognito-idp.%1.amazonaws.com/%2/.well-known/jwks.json
\ No newline at end of file
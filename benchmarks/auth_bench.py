@@ -0,0 +1,220 @@
+"""Auth path benchmark, against a local stand-in for the Cognito JWKS endpoint.
+
+Starts a local HTTP server serving a generated JWKS, mints RS256 tokens with the
+matching keys and measures mm_onconnect.validate_jwt:
+  - cold: cognito_verifier re-initialised (key fetch included) before each call
+  - warm: new token every call, keys already in memory
+  - warm cached: the same token again, served by the claims cache
+  - rotating: the pool signs with a new key every --rotate-every tokens
+plus the time of each stage (parse, key fetch, key build, verify).
+
+With --snapshot the keys are bundled like snapshot_jwks.bat does, so cold starts need no fetch.
+
+usage: python benchmarks/auth_bench.py [--runs 1000] [--snapshot] [--deps auth_dependencies/python]
+"""
+import argparse
+import base64
+import hashlib
+import http.server
+import importlib
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGION = 'bench-region'
+USER_POOL_ID = 'bench-pool'
+CLIENT_ID = 'bench-client'
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}"
+
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def int_to_b64(n):
+    return b64encode(n.to_bytes((n.bit_length() + 7) // 8, 'big')).decode()
+
+
+# Signing keys of the fake user pool, and the JWKS server publishing them
+class FakeUserPool:
+    def __init__(self):
+        self.keys = []
+        self.key_count = 0
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.token_count = 0
+        self.add_key()
+
+    def add_key(self):
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        numbers = private_key.public_key().public_numbers()
+        self.key_count += 1
+        kid = f"bench-{self.key_count}"
+        jwk = {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'alg': 'RS256', 'n': int_to_b64(numbers.n), 'e': int_to_b64(numbers.e)}
+        with self.lock:
+            # like Cognito, the pool publishes the current and the previous key
+            self.keys = (self.keys + [(kid, private_key, jwk)])[-2:]
+        return kid
+
+    def jwks(self):
+        with self.lock:
+            return json.dumps({'keys': [jwk for _, _, jwk in self.keys]}).encode()
+
+    def mint(self, username='bench-player'):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        kid, private_key, _ = self.keys[-1]
+        self.token_count += 1
+        now = int(time.time())
+        header = {'kid': kid, 'alg': 'RS256'}
+        claims = {
+            'sub': f"sub-{self.token_count}",
+            'iss': ISSUER,
+            'aud': CLIENT_ID,
+            'token_use': 'id',
+            'cognito:username': username,
+            'auth_time': now,
+            'iat': now,
+            'exp': now + 3600,
+            'jti': str(self.token_count),
+        }
+        signing_input = b64encode(json.dumps(header).encode()) + b'.' + b64encode(json.dumps(claims).encode())
+        signature = private_key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+        return (signing_input + b'.' + b64encode(signature)).decode()
+
+    def serve(self):
+        pool = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                pool.fetches += 1
+                body = pool.jwks()
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_port}/.well-known/jwks.json"
+
+
+def load_handler(name):
+    spec = importlib.util.spec_from_file_location(f"{name}_app", os.path.join(ROOT, name, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def report(name, samples):
+    q = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    print(f"{name:<34}{len(samples):>7}{q[49]:>10.3f}{q[94]:>10.3f}{q[98]:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=1000)
+    parser.add_argument('--cold-runs', type=int, default=50)
+    parser.add_argument('--rotate-every', type=int, default=100)
+    parser.add_argument('--snapshot', action='store_true', help='load the keys from a bundled snapshot on cold start')
+    parser.add_argument('--deps', default=os.path.join(ROOT, 'auth_dependencies', 'python'),
+                        help='layer directory holding cryptography, used when it is not installed')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(ROOT, 'common', 'python'))
+    sys.path.append(args.deps)
+
+    pool = FakeUserPool()
+    snapshot = os.path.join(tempfile.mkdtemp(), 'cognito_jwks.json')
+    if args.snapshot:
+        with open(snapshot, 'wb') as f:
+            f.write(pool.jwks())
+
+    os.environ.update({
+        'COGNITO_REGION': REGION,
+        'COGNITO_USER_POOL_ID': USER_POOL_ID,
+        'COGNITO_USER_POOL_CLIENT_ID': CLIENT_ID,
+        'COGNITO_JWKS_URL': pool.serve(),
+        'JWKS_SNAPSHOT': snapshot,
+        # rotation is measured without the rate limit on unknown kids
+        'JWKS_MIN_REFRESH_INTERVAL': '0',
+    })
+
+    import cognito_verifier
+
+    handlers = {name: load_handler(name) for name in ('mm_onconnect',)}
+
+    print(f"{'latency (ms)':<34}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, handler in handlers.items():
+        # cold: a fresh container initialises the verifier (loading or fetching the keys) before the first call
+        samples = []
+        for _ in range(args.cold_runs):
+            token = pool.mint()
+            start = time.perf_counter()
+            importlib.reload(cognito_verifier)
+            handler.validate_jwt(token)
+            samples.append((time.perf_counter() - start) * 1000)
+        report(f"{name} cold", samples)
+
+        tokens = [pool.mint() for _ in range(args.runs)]
+        report(f"{name} warm", [timed(handler.validate_jwt, token) for token in tokens])
+        report(f"{name} warm cached", [timed(handler.validate_jwt, token) for token in tokens])
+
+        samples = []
+        for i in range(args.runs):
+            if i % args.rotate_every == 0:
+                pool.add_key()
+            samples.append(timed(handler.validate_jwt, pool.mint()))
+        report(f"{name} rotating keys", samples)
+
+    # time of each stage of a verification
+    key_store = cognito_verifier.key_store
+    tokens = [pool.mint() for _ in range(args.runs)]
+    parsed = [cognito_verifier.parse_token(token) for token in tokens]
+    jwk = json.loads(pool.jwks())['keys'][-1]
+    key = cognito_verifier.build_public_key(jwk)
+
+    def fetch():
+        key_store.last_fetch = float('-inf')
+        key_store.fetch()
+
+    print()
+    print(f"{'stage (ms)':<34}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    report('parse', [timed(cognito_verifier.parse_token, token) for token in tokens])
+    report('key fetch (304, kept-alive)', [timed(fetch) for _ in range(min(args.runs, 200))])
+    report('key build', [timed(cognito_verifier.build_public_key, jwk) for _ in range(args.runs)])
+    report('verify', [timed(cognito_verifier.verify_signature, key, p[2], p[3]) for p in parsed])
+    print(f"\nJWKS fetches served: {pool.fetches}")
+
+
+if __name__ == '__main__':
+    main()
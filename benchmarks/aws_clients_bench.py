@@ -0,0 +1,158 @@
+"""Warm invocation latency with per-invocation boto3 clients vs the shared aws_clients.
+
+A local HTTP server stands in for DynamoDB, GameLift and the API Gateway
+management API (AWS_ENDPOINT_URL points every client at it). The AWS calls of
+three handlers are replayed as warm invocations:
+  - mm_onconnect: GetItem on the player table, then StartMatchmaking
+  - mm_onmatchfound: PutItem on the matches table, then a message to each player
+  - srv_postmatchresult: two UpdateItem per player
+"before" builds its clients inside the invocation like the handlers used to,
+"after" gets them from aws_clients. The server is plain HTTP, so the TLS
+handshake a new client pays against the real endpoints is not included.
+
+usage: python benchmarks/aws_clients_bench.py [--runs 300] [--players 8]
+"""
+import argparse
+import http.server
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAYER = {'username': {'S': 'bench-player'}, 'totalCubesDropped': {'N': '120'}, 'matchCount': {'N': '4'}}
+
+
+# Answers the few operations the handlers use, and counts the connections opened
+class FakeAws(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as two writes, without this a kept-alive connection waits on delayed ACKs
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        FakeAws.connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        target = self.headers.get('X-Amz-Target', '')
+        if target == 'DynamoDB_20120810.GetItem':
+            body = {'Item': PLAYER}
+        elif target == 'DynamoDB_20120810.UpdateItem':
+            body = {'Attributes': PLAYER}
+        elif target == 'GameLift.StartMatchmaking':
+            body = {'MatchmakingTicket': {'TicketId': 'bench-ticket', 'Status': 'QUEUED'}}
+        else:
+            # PutItem and the management API PostToConnection
+            body = {}
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeAws)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=300)
+    parser.add_argument('--players', type=int, default=8)
+    args = parser.parse_args()
+
+    endpoint = serve()
+    os.environ.update({
+        'AWS_ENDPOINT_URL': endpoint,
+        'AWS_DEFAULT_REGION': 'eu-west-3',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+    })
+    sys.path.insert(0, os.path.join(ROOT, 'common', 'python'))
+
+    import boto3
+    import aws_clients
+
+    gateway_url = f"{endpoint}/prod"
+    players = [f"player-{i}" for i in range(args.players)]
+
+    def onconnect(gamelift, table):
+        item = table.get_item(Key={'username': 'bench-player'})['Item']
+        gamelift.start_matchmaking(
+            TicketId='bench-ticket',
+            ConfigurationName='bench',
+            Players=[{'PlayerId': item['username'], 'PlayerAttributes': {'skill': {'N': 30}}}],
+        )
+
+    def onmatchfound(table, gateway):
+        table.put_item(Item={'matchId': 'bench-match', 'taskId': 'bench-task', 'players': players})
+        for player in players:
+            gateway.post_to_connection(ConnectionId=player, Data=json.dumps({'status': 'found'}))
+
+    def postmatchresult(table):
+        for player in players[:2]:
+            table.update_item(
+                Key={'username': player},
+                UpdateExpression='SET totalCubesDropped = totalCubesDropped + :cubesDropped',
+                ExpressionAttributeValues={':cubesDropped': 10},
+                ReturnValues='ALL_NEW',
+            )
+            table.update_item(
+                Key={'username': player},
+                UpdateExpression='SET achievements = :achievements',
+                ExpressionAttributeValues={':achievements': [0]},
+            )
+
+    def before_onmatchfound():
+        table = boto3.resource('dynamodb').Table('matches')
+        table.put_item(Item={'matchId': 'bench-match', 'taskId': 'bench-task', 'players': players})
+        # the old handler built the management API client for each player
+        for player in players:
+            gateway = boto3.client('apigatewaymanagementapi', endpoint_url=gateway_url)
+            gateway.post_to_connection(ConnectionId=player, Data=json.dumps({'status': 'found'}))
+
+    scenarios = {
+        'mm_onconnect': (
+            lambda: onconnect(boto3.client('gamelift'), boto3.resource('dynamodb').Table('players')),
+            lambda: onconnect(aws_clients.client('gamelift'), aws_clients.table('players')),
+        ),
+        'mm_onmatchfound': (
+            before_onmatchfound,
+            lambda: onmatchfound(aws_clients.table('matches'),
+                                 aws_clients.client('apigatewaymanagementapi', endpoint_url=gateway_url)),
+        ),
+        'srv_postmatchresult': (
+            lambda: postmatchresult(boto3.resource('dynamodb').Table('players')),
+            lambda: postmatchresult(aws_clients.table('players')),
+        ),
+    }
+
+    print(f"{'warm invocation (ms)':<34}{'p50':>10}{'p95':>10}{'p99':>10}{'conns/inv':>11}")
+    for name, variants in scenarios.items():
+        for label, invoke in zip(('before', 'after'), variants):
+            # the first invocation is the cold one, not measured
+            invoke()
+            connections = FakeAws.connections
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                invoke()
+                samples.append((time.perf_counter() - start) * 1000)
+            q = statistics.quantiles(samples, n=100)
+            opened = (FakeAws.connections - connections) / args.runs
+            print(f"{name + ' ' + label:<34}{q[49]:>10.3f}{q[94]:>10.3f}{q[98]:>10.3f}{opened:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Time to notify every player of a match, one by one vs with the Broadcaster.
+
+The FakeAws server of aws_clients_bench.py stands in for the API Gateway
+management API and waits --latency ms before answering each call, like the
+round trip to the real endpoint. Every --gone th connection answers
+GoneException. Reported per match size: the latency of a serial loop over
+post_to_connection on the shared client, and of Broadcaster.post, with the
+outcome counts of the broadcast.
+
+usage: python benchmarks/broadcast_bench.py [--players 4 16 64] [--latency 20]
+"""
+import argparse
+import http.server
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aws_clients_bench import FakeAws  # noqa: E402
+
+
+class SlowGateway(FakeAws):
+    latency = 0.02
+    gone = 5
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        # /prod/@connections/player-N
+        player = int(self.path.rsplit('-', 1)[-1])
+        if self.gone and player % self.gone == self.gone - 1:
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            data = b'{"message": "Gone"}'
+            self.send_response(410)
+            self.send_header('x-amzn-ErrorType', 'GoneException')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        super().do_POST()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--latency', type=float, default=20, help='ms per call')
+    parser.add_argument('--gone', type=int, default=5, help='every n-th connection is gone, 0 for none')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    SlowGateway.latency = args.latency / 1000
+    SlowGateway.gone = args.gone
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowGateway)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'AWS_DEFAULT_REGION': 'eu-west-3',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+    })
+    sys.path.insert(0, os.path.join(ROOT, 'common', 'python'))
+
+    import aws_clients
+    import broadcaster
+
+    endpoint = f"http://127.0.0.1:{server.server_port}/prod"
+    gateway = aws_clients.client('apigatewaymanagementapi', endpoint_url=endpoint)
+    # the Broadcaster resolves the same client from the execute-api URL, point it at the server
+    aws_clients.gateway = lambda api_id, region, stage: gateway
+    broadcast = broadcaster.Broadcaster('bench', 'eu-west-3', 'prod')
+
+    def serial(connection_ids):
+        for connection_id in connection_ids:
+            try:
+                gateway.post_to_connection(ConnectionId=connection_id, Data='{"status": "found"}')
+            except gateway.exceptions.GoneException:
+                pass
+
+    print(f"{'players':>8}{'serial ms':>12}{'broadcast ms':>14}  outcomes")
+    for players in args.players:
+        connection_ids = [f"player-{i}" for i in range(players)]
+        results = []
+        for run in (lambda: serial(connection_ids), lambda: broadcast.post(connection_ids, {'status': 'found'})):
+            # warm the connections
+            run()
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                outcomes = run()
+                samples.append((time.perf_counter() - start) * 1000)
+            results.append(statistics.median(samples))
+        print(f"{players:>8}{results[0]:>12.1f}{results[1]:>14.1f}  {outcomes}")
+
+
+if __name__ == '__main__':
+    main()
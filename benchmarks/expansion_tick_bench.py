@@ -0,0 +1,86 @@
+"""Cost of a tick of the local FlexMatch engine with a large waiting queue.
+
+--tickets players wait with skills too far apart to ever match, their start
+times spread over the request timeout less the --ticks measured, so each
+simulated second a slice of them crosses an expansion step and none times out
+(a timeout is a removal from the skill index, not scheduling). The deadline
+heap of LocalFlexMatch.tick is compared to a scan of every waiting ticket (the
+engine before the heap), both run on the same queue.
+
+usage: python benchmarks/expansion_tick_bench.py [--tickets 100000 1000000] [--ticks 30]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'algorithm_mm_test'))
+
+from flexmatch import LocalFlexMatch, load_configuration  # noqa: E402
+
+
+# tick of the engine before the deadline heap
+def scan_tick(engine):
+    now = engine.clock()
+    for ticket in list(engine.tickets.values()):
+        if ticket.ticket_id not in engine.tickets:
+            continue
+
+        if now - ticket.start_time >= engine.request_timeout:
+            engine.remove(ticket)
+            engine.timed_out += 1
+        elif ticket.next_expansion is not None and now >= ticket.next_expansion:
+            engine.expand(ticket, now)
+            engine.settle(engine.index_of(ticket), now)
+
+
+def queue(n, spread, request_timeout, now):
+    rule_set, _ = load_configuration(os.path.join(ROOT, 'matchmaking.yaml'))
+    # keep the steps but never let them reach the spacing of the skills
+    rule_set.steps[1:] = [(wait, min(value, 500)) for wait, value in rule_set.steps[1:]]
+    engine = LocalFlexMatch(rule_set, request_timeout=request_timeout, clock=lambda: now[0])
+    for i in range(n):
+        now[0] = -spread * (n - i) / n
+        engine.start_matchmaking(TicketId=str(i), Players=[
+            {'PlayerId': f"player-{i}", 'PlayerAttributes': {'skill': {'N': i * 1000}}}
+        ])
+    # bring the backdated tickets to the step of their age, not timed
+    now[0] = -1.0
+    engine.tick()
+    engine.timed_out = 0
+    return engine
+
+
+def run(n, ticks, request_timeout, name, tick):
+    now = [0.0]
+    engine = queue(n, request_timeout - ticks, request_timeout, now)
+    times = []
+    expanded = 0
+    for second in range(ticks):
+        now[0] = float(second)
+        steps = sum(ticket.step for ticket in engine.tickets.values())
+        t = time.perf_counter()
+        tick(engine)
+        times.append(time.perf_counter() - t)
+        expanded += sum(ticket.step for ticket in engine.tickets.values()) - steps
+    print(f"{name:<8}{n:>10}{expanded / ticks:>12.0f}{statistics.mean(times) * 1000:>12.3f}"
+          f"{max(times) * 1000:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickets', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--ticks', type=int, default=30)
+    parser.add_argument('--request-timeout', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'':<8}{'tickets':>10}{'expanded':>12}{'tick ms':>12}{'max':>12}")
+    for n in args.tickets:
+        run(n, args.ticks, args.request_timeout, 'scan', scan_tick)
+        run(n, args.ticks, args.request_timeout, 'heap', LocalFlexMatch.tick)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Throughput of the local FlexMatch engine with the rule set of matchmaking.yaml.
+
+Tickets arrive at --rate per second of simulated time with skills drawn from
+a normal distribution, and the engine ticks every simulated second. The run
+is timed on the wall clock and reports the tickets processed per second and
+the latency of start_matchmaking and tick.
+
+usage: python benchmarks/flexmatch_bench.py [--tickets 200000] [--rate 10000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'algorithm_mm_test'))
+
+from flexmatch import LocalFlexMatch, load_configuration  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickets', type=int, default=200000)
+    parser.add_argument('--rate', type=float, default=10000, help='arrivals per simulated second')
+    parser.add_argument('--mean', type=float, default=1100)
+    parser.add_argument('--stddev', type=float, default=150)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rule_set, request_timeout = load_configuration(os.path.join(ROOT, 'matchmaking.yaml'))
+    now = [0.0]
+    events = Counter()
+    engine = LocalFlexMatch(rule_set, request_timeout=request_timeout,
+                            listener=lambda message: events.update([message['detail']['type']]),
+                            clock=lambda: now[0])
+
+    rng = random.Random(args.seed)
+    requests = [
+        [{'PlayerId': f"player-{i}", 'PlayerAttributes': {'skill': {'N': int(rng.gauss(args.mean, args.stddev))}}}]
+        for i in range(args.tickets)
+    ]
+
+    starts = []
+    ticks = []
+    next_tick = 1.0
+    began = time.perf_counter()
+    for i, players in enumerate(requests):
+        now[0] = i / args.rate
+        if now[0] >= next_tick:
+            t = time.perf_counter()
+            engine.tick()
+            ticks.append(time.perf_counter() - t)
+            next_tick += 1
+
+        t = time.perf_counter()
+        engine.start_matchmaking(TicketId=str(i), Players=players)
+        starts.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - began
+
+    q = statistics.quantiles(starts, n=100)
+    print(f"{args.tickets} tickets in {elapsed:.2f} s: {args.tickets / elapsed:,.0f} tickets/s "
+          f"({args.tickets / args.rate:.0f} s simulated)")
+    print(f"start_matchmaking us  p50 {q[49] * 1e6:.1f}  p99 {q[98] * 1e6:.1f}  max {max(starts) * 1e6:.1f}")
+    if ticks:
+        print(f"tick ms               mean {statistics.mean(ticks) * 1000:.2f}  max {max(ticks) * 1000:.2f}")
+    print(f"events {dict(events)}, still waiting {len(engine.tickets)}")
+
+
+if __name__ == '__main__':
+    main()
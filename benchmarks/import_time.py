@@ -0,0 +1,71 @@
+"""Compare the import cost of the $connect auth path.
+
+Each path is imported in a fresh interpreter, like a Lambda cold start, and the
+median over the runs is reported.
+
+usage: python benchmarks/import_time.py [--runs 20] [--deps auth_dependencies/python]
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = {
+    # what mm_onconnect and the authorizer imported before the lean verifier
+    'jwt + requests': 'import jwt\nimport requests\nfrom jwt import PyJWKClient',
+    'cognito_verifier': 'import cognito_verifier',
+}
+
+
+def write_snapshot(path):
+    # cognito_verifier loads its keys at import, give it a local snapshot so no fetch is timed
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    numbers = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key().public_numbers()
+
+    def b64(n):
+        return base64.urlsafe_b64encode(n.to_bytes((n.bit_length() + 7) // 8, 'big')).rstrip(b'=').decode()
+
+    with open(path, 'w') as f:
+        json.dump({'keys': [{'kty': 'RSA', 'kid': 'bench', 'use': 'sig', 'alg': 'RS256',
+                             'n': b64(numbers.n), 'e': b64(numbers.e)}]}, f)
+
+
+def time_import(code, env):
+    script = f"import time\nt = time.perf_counter()\n{code}\nprint(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', script], env=env, check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--deps', default=os.path.join(ROOT, 'auth_dependencies', 'python'),
+                        help='layer directory holding jwt, requests and cryptography')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'cognito_jwks.json')
+        write_snapshot(snapshot)
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.join(ROOT, 'common', 'python'), args.deps])
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+        env['JWKS_SNAPSHOT'] = snapshot
+
+        print(f"{'path':<20}{'median ms':>12}{'min ms':>12}")
+        for name, code in PATHS.items():
+            # first run warms the OS page cache
+            time_import(code, env)
+            samples = [time_import(code, env) * 1000 for _ in range(args.runs)]
+            print(f"{name:<20}{statistics.median(samples):>12.2f}{min(samples):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Per tick cost of incremental grouping vs regrouping the whole queue.
+
+The waiting players of a queue of --sizes have MMR evenly spaced over
+[1000, 1200), and max_distance is match_size - 1.5 times that spacing, so
+groups only form around new players and the queue keeps its size. Each tick
+--churn players arrive (MMR uniform) and a tenth as many leave, then the
+groups of --match-size are formed. Reported per queue size, in ms per tick:
+IncrementalGroups updated with the churn, the same grouping rebuilt from
+every waiting player, and the exact partition of partition.py over the
+queue, with the groups formed per tick.
+
+usage: python benchmarks/incremental_bench.py [--sizes 10000 100000 1000000] [--churn 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'algorithm_mm_test'))
+
+from incremental import IncrementalGroups  # noqa: E402
+from partition import partition  # noqa: E402
+
+
+def rebuild(players, skills, match_size, max_distance):
+    grouping = IncrementalGroups(match_size, max_distance)
+    for player_id in players:
+        grouping.add(player_id, skills[player_id])
+    return grouping.groups()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--churn', type=int, default=100, help='arrivals per tick')
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--match-size', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'players':>10}{'waiting':>10}{'groups':>8}{'incr ms':>10}{'rebuild ms':>12}{'partition ms':>14}")
+    for n in args.sizes:
+        spacing = 200 / n
+        max_distance = (args.match_size - 1.5) * spacing
+        skills = {}
+        grouping = IncrementalGroups(args.match_size, max_distance)
+        for player_id in range(n):
+            skills[player_id] = 1000 + player_id * spacing
+            grouping.add(player_id, skills[player_id])
+
+        incremental = []
+        rebuilt = []
+        partitioned = []
+        formed = 0
+        next_id = n
+        for _ in range(args.ticks):
+            arrivals = []
+            for _ in range(args.churn):
+                skills[next_id] = rng.uniform(1000, 1200)
+                arrivals.append(next_id)
+                next_id += 1
+            departures = rng.sample(list(grouping), args.churn // 10)
+
+            start = time.perf_counter()
+            for player_id in arrivals:
+                grouping.add(player_id, skills[player_id])
+            for player_id in departures:
+                grouping.remove(player_id)
+            elapsed = time.perf_counter() - start
+            waiting = list(grouping)
+            start = time.perf_counter()
+            formed += len(grouping.groups())
+            incremental.append(elapsed + time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rebuild(waiting, skills, args.match_size, max_distance)
+            rebuilt.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            partition([skills[p] for p in waiting], args.match_size)
+            partitioned.append(time.perf_counter() - start)
+
+        print(f"{n:>10}{len(grouping):>10}{formed / args.ticks:>8.1f}{statistics.mean(incremental) * 1000:>10.3f}"
+              f"{statistics.mean(rebuilt) * 1000:>12.1f}{statistics.mean(partitioned) * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
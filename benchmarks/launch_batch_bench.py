@@ -0,0 +1,70 @@
+"""run_task calls of mm_onmatchfound with and without the batching window.
+
+Simulated on a virtual clock: matches needing a new task arrive at random at
+--rate per minute. Without a window every match is its own invocation and
+run_task call. With the SQS event source a batch closes after --window
+seconds from its first message or at 10 messages, and its matches are
+launched RUN_TASK_MAX_COUNT per call. Reported: run_task calls, the busiest
+second of calls (ECS throttles RunTask per second) and the wait a match
+spends in the window.
+
+usage: python benchmarks/launch_batch_bench.py [--rate 30 120 600] [--window 0 0.5 1 2]
+"""
+import argparse
+import collections
+import math
+import random
+import statistics
+
+BATCH_SIZE = 10
+RUN_TASK_MAX_COUNT = 10
+
+
+def arrivals(rate, minutes, rng):
+    t = 0.0
+    times = []
+    while True:
+        t += rng.expovariate(rate / 60)
+        if t >= minutes * 60:
+            return times
+        times.append(t)
+
+
+def simulate(times, window):
+    calls = []
+    waits = []
+    i = 0
+    while i < len(times):
+        first = times[i]
+        batch = [first]
+        i += 1
+        while i < len(times) and len(batch) < BATCH_SIZE and times[i] - first <= window:
+            batch.append(times[i])
+            i += 1
+        # the batch goes when full or when the window is over
+        sent = batch[-1] if len(batch) == BATCH_SIZE else first + window
+        waits += [sent - t for t in batch]
+        calls += [sent] * math.ceil(len(batch) / RUN_TASK_MAX_COUNT)
+    busiest = max(collections.Counter(int(t) for t in calls).values())
+    return len(calls), busiest, waits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, nargs='+', default=[30, 120, 600], help='matches per minute')
+    parser.add_argument('--window', type=float, nargs='+', default=[0, 0.5, 1, 2], help='seconds')
+    parser.add_argument('--minutes', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'rate':>6}{'window s':>10}{'run_task':>10}{'busiest s':>11}{'wait p50/max s':>17}")
+    for rate in args.rate:
+        times = arrivals(rate, args.minutes, random.Random(args.seed))
+        for window in args.window:
+            calls, busiest, waits = simulate(times, window)
+            print(f"{rate:>6}{window:>10}{calls:>10}{busiest:>11}"
+                  f"{statistics.median(waits):>9.2f} /{max(waits):>5.2f}")
+
+
+if __name__ == '__main__':
+    main()
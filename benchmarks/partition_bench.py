@@ -0,0 +1,64 @@
+"""Optimal 1-D partition vs the k-means prototype of algorithm_mm_test.
+
+Players get MMR uniform in [1000, 1200) like in mm_test.py and are split into
+matches of --match-size. Reported per player count: the time, the mean and
+max MMR spread (max - min) of the matches, and how many players end up in a
+match of exactly --match-size. k-means is skipped when its per-point loop
+would take more than --kmeans-budget distance evaluations.
+
+usage: python benchmarks/partition_bench.py [--sizes 1000 100000 1000000] [--match-size 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'algorithm_mm_test'))
+
+from mm_test import k_means_cluster  # noqa: E402
+from partition import partition, spread  # noqa: E402
+
+
+def report(name, n, elapsed, spreads, matched):
+    print(f"{name:<12}{n:>10}{elapsed * 1000:>12.1f}{np.mean(spreads):>10.2f}{np.max(spreads):>10.0f}{matched:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--match-size', type=int, default=4)
+    parser.add_argument('--kmeans-iterations', type=int, default=20)
+    parser.add_argument('--kmeans-budget', type=float, default=1e8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    g = args.match_size
+
+    print(f"{'':<12}{'players':>10}{'ms':>12}{'spread':>10}{'max':>10}{'matched':>10}")
+    for n in args.sizes:
+        players = rng.integers(1000, 1200, n)
+
+        start = time.perf_counter()
+        groups, unmatched = partition(players, g)
+        elapsed = time.perf_counter() - start
+        report('partition', n, elapsed, spread(players, groups), groups.size)
+
+        k = n // g
+        if n * k * args.kmeans_iterations > args.kmeans_budget:
+            print(f"{'k-means':<12}{n:>10}   skipped, {n * k * args.kmeans_iterations:.0e} distance evaluations")
+            continue
+
+        np.random.seed(args.seed)
+        start = time.perf_counter()
+        clusters = k_means_cluster(k, players, max_iterations=args.kmeans_iterations)
+        elapsed = time.perf_counter() - start
+        spreads = [max(cluster) - min(cluster) for cluster in clusters if cluster]
+        report('k-means', n, elapsed, spreads, sum(len(cluster) for cluster in clusters if len(cluster) == g))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Game server tasks needed with one match per task vs slots packed per task.
+
+Simulated on a virtual clock: matches arrive at random at --rate per minute
+and last 5 to 15 minutes. Each is placed the way placement.place does it, in
+the fullest task that still has a free slot, and a task is launched only when
+every task is full. A task stops after the claim agent's IDLE_TIMEOUT without
+a match, a task of one slot stops with its server. Reported per slot count:
+run_task calls, the most tasks running at once and the task minutes paid for
+(the task size is the same, a slot count above 1 assumes the task has the CPU
+for that many servers).
+
+usage: python benchmarks/placement_bench.py [--rate 2 8] [--slots 1 2 4 8] [--minutes 240]
+"""
+import argparse
+import heapq
+import random
+
+# seconds an empty task waits for a match before it stops, as the claim agent
+IDLE_TIMEOUT = 300
+
+
+def simulate(rate, slots, minutes, rng):
+    # task -> slots taken, task -> when it became empty
+    used = {}
+    empty_since = {}
+    # (end, task) of the running matches
+    ends = []
+    launches = 0
+    peak = 0
+    task_seconds = 0.0
+    started = {}
+    tasks = iter(range(1 << 30))
+    # a single slot task stops with its server
+    idle_timeout = IDLE_TIMEOUT if slots > 1 else 0
+
+    def stop_idle(now):
+        nonlocal task_seconds
+        for task, since in list(empty_since.items()):
+            if now - since >= idle_timeout:
+                task_seconds += since + idle_timeout - started.pop(task)
+                del empty_since[task]
+                del used[task]
+
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate / 60)
+        if t >= minutes * 60:
+            break
+
+        # matches over before this one
+        while ends and ends[0][0] <= t:
+            end, task = heapq.heappop(ends)
+            stop_idle(end)
+            used[task] -= 1
+            if used[task] == 0:
+                empty_since[task] = end
+        stop_idle(t)
+
+        # best fit: the fullest task with a free slot
+        open_tasks = [task for task, n in used.items() if n < slots]
+        if open_tasks:
+            task = max(open_tasks, key=used.get)
+        else:
+            task = next(tasks)
+            used[task] = 0
+            started[task] = t
+            launches += 1
+        used[task] += 1
+        empty_since.pop(task, None)
+        heapq.heappush(ends, (t + rng.uniform(5, 15) * 60, task))
+        peak = max(peak, len(used))
+
+    # what is still running at the end
+    end = minutes * 60
+    task_seconds += sum(end - since for since in started.values())
+    return launches, peak, task_seconds / 60
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, nargs='+', default=[2, 8], help='matches per minute')
+    parser.add_argument('--slots', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--minutes', type=int, default=240)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'rate':>6}{'slots':>7}{'run_task':>10}{'peak tasks':>12}{'task min':>10}")
+    for rate in args.rate:
+        for slots in args.slots:
+            launches, peak, task_minutes = simulate(rate, slots, args.minutes, random.Random(args.seed))
+            print(f"{rate:>6}{slots:>7}{launches:>10}{peak:>12}{task_minutes:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
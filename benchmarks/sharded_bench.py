@@ -0,0 +1,77 @@
+"""Throughput of the sharded local FlexMatch engine over 1, 2, 4 and 8 workers.
+
+Like flexmatch_bench.py, tickets arrive at --rate per second of simulated
+time with skills drawn from a normal distribution, with the rule set of
+matchmaking.yaml. The shard bounds are quantiles of the skills and the engine
+ticks every --tick-interval simulated seconds. Reported per worker count: the
+tickets processed per wall clock second, the speedup over one worker, the CPU
+time of the coordinator process per ticket (its inverse bounds the
+throughput whatever the workers), the matches made across shard bounds, and
+the tickets resolved twice (always 0). Scaling needs as many free cores as
+workers.
+
+usage: python benchmarks/sharded_bench.py [--workers 1 2 4 8] [--tickets 400000] [--rate 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'algorithm_mm_test'))
+
+from flexmatch import load_configuration  # noqa: E402
+from sharded import ShardedFlexMatch, quantile_bounds  # noqa: E402
+
+
+def run(workers, requests, skills, args):
+    rule_set, request_timeout = load_configuration(os.path.join(ROOT, 'matchmaking.yaml'))
+    now = [0.0]
+    bounds = quantile_bounds(skills, workers)
+    with ShardedFlexMatch(rule_set, bounds, request_timeout=request_timeout, clock=lambda: now[0]) as engine:
+        next_tick = args.tick_interval
+        began = time.perf_counter()
+        cpu = time.process_time()
+        for i, players in enumerate(requests):
+            now[0] = i / args.rate
+            if now[0] >= next_tick:
+                engine.tick()
+                next_tick += args.tick_interval
+            engine.start_matchmaking(TicketId=str(i), Players=players)
+        engine.tick()
+        elapsed = time.perf_counter() - began
+        cpu = time.process_time() - cpu
+        return elapsed, cpu, engine.matched, engine.crossing, engine.resolved_twice, len(engine.waiting)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--tickets', type=int, default=400000)
+    parser.add_argument('--rate', type=float, default=20000, help='arrivals per simulated second')
+    parser.add_argument('--tick-interval', type=float, default=0.1, help='simulated seconds between ticks')
+    parser.add_argument('--mean', type=float, default=1100)
+    parser.add_argument('--stddev', type=float, default=150)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    skills = [int(rng.gauss(args.mean, args.stddev)) for _ in range(args.tickets)]
+    requests = [[{'PlayerId': f"player-{i}", 'PlayerAttributes': {'skill': {'N': skill}}}]
+                for i, skill in enumerate(skills)]
+
+    print(f"{os.cpu_count()} cores")
+    print(f"{'workers':>8}{'seconds':>10}{'tickets/s':>12}{'speedup':>9}{'coord us':>10}{'matches':>10}"
+          f"{'crossing':>10}"
+          f"{'twice':>7}{'waiting':>9}")
+    baseline = None
+    for workers in args.workers:
+        elapsed, cpu, matched, crossing, twice, waiting = run(workers, requests, skills, args)
+        baseline = baseline or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{args.tickets / elapsed:>12,.0f}{baseline / elapsed:>9.2f}"
+              f"{cpu / args.tickets * 1e6:>10.1f}{matched:>10}{crossing:>10}{twice:>7}{waiting:>9}")
+
+
+if __name__ == '__main__':
+    main()
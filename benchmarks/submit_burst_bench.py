@@ -0,0 +1,217 @@
+"""Burst of connects: StartMatchmaking called directly vs through the ticket queue.
+
+A local HTTP server stands in for GameLift, throttling StartMatchmaking above
+--rate calls per second, and for the active tickets table. --players connects
+arrive at once:
+  - direct: each connect calls StartMatchmaking, like mm_onconnect used to,
+    from --concurrency handlers at a time, each with its own client. A
+    connect that fails after the client's retries is a player told
+    "Unauthorized" who will reconnect.
+  - queued: each connect puts its ticket on a LocalQueue and returns, then
+    --consumers mm_submitticket instances drain it at 90% of --rate.
+All latencies are from the start of the burst. Reported: connect
+acknowledgement latency, tickets started and failed, throttled calls, time
+from connect to ticket started, and the throughput.
+
+usage: python benchmarks/submit_burst_bench.py [--players 2000] [--rate 200]
+"""
+import argparse
+import http.server
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeAws(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    bucket = None
+    lock = threading.Lock()
+    started = {}
+    throttled = 0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        target = self.headers.get('X-Amz-Target', '')
+        status = 200
+        if target == 'GameLift.StartMatchmaking':
+            if FakeAws.bucket.try_acquire() != 0:
+                with FakeAws.lock:
+                    FakeAws.throttled += 1
+                status, body = 400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'}
+            else:
+                with FakeAws.lock:
+                    duplicate = request['TicketId'] in FakeAws.started
+                    FakeAws.started.setdefault(request['TicketId'], time.monotonic())
+                if duplicate:
+                    status, body = 400, {'__type': 'InvalidRequestException', 'message': 'Ticket already exists'}
+                else:
+                    body = {'MatchmakingTicket': {'TicketId': request['TicketId'], 'Status': 'QUEUED'}}
+        elif target == 'GameLift.DescribeMatchmaking':
+            # mm_submitticket tells a duplicate from a rejected ticket with it
+            with FakeAws.lock:
+                known = [ticket_id for ticket_id in request['TicketIds'] if ticket_id in FakeAws.started]
+            body = {'TicketList': [{'TicketId': ticket_id, 'Status': 'QUEUED'} for ticket_id in known]}
+        elif target == 'DynamoDB_20120810.GetItem':
+            # every queued player is still connected
+            player_id = request['Key']['playerId']['S']
+            body = {'Item': {'playerId': {'S': player_id}, 'ticketId': {'S': f"ticket-{player_id}"}}}
+        else:
+            body = {}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class Context:
+    def __init__(self, timeout_ms=10000):
+        self.deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def load_consumer(index):
+    spec = importlib.util.spec_from_file_location(f"mm_submitticket_{index}", os.path.join(ROOT, 'mm_submitticket', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentiles(samples):
+    q = statistics.quantiles(samples, n=100)
+    return f"p50 {q[49]:9.3f}  p95 {q[94]:9.3f}  p99 {q[98]:9.3f}"
+
+
+def reset(rate, ticket_queue):
+    FakeAws.bucket = ticket_queue.TokenBucket(rate, rate)
+    FakeAws.started = {}
+    FakeAws.throttled = 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=200, help='StartMatchmaking calls per second before throttling')
+    parser.add_argument('--concurrency', type=int, default=64, help='mm_onconnect invocations at a time')
+    parser.add_argument('--consumers', type=int, default=2)
+    parser.add_argument('--visibility-timeout', type=float, default=1)
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeAws)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'AWS_ENDPOINT_URL': f"http://127.0.0.1:{server.server_port}",
+        'AWS_DEFAULT_REGION': 'eu-west-3',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'AWS_MAX_POOL_CONNECTIONS': str(args.concurrency),
+        'ACTIVE_TICKETS_TABLE': 'active-tickets',
+        'MATCHMAKING_CONFIG_NAME': 'bench',
+        'SUBMIT_RATE': str(args.rate * 0.9 / args.consumers),
+        'SUBMIT_BURST': '1',
+    })
+    sys.path.insert(0, os.path.join(ROOT, 'common', 'python'))
+
+    import boto3
+    import aws_clients
+    import ticket_queue
+    from botocore.exceptions import ClientError
+
+    players = [f"player-{i}" for i in range(args.players)]
+    # each concurrent mm_onconnect is a warm container, with its own client and retry rate limiter
+    clients = [boto3.session.Session().client('gamelift', config=aws_clients.CONFIG) for _ in range(args.concurrency)]
+    containers = threading.local()
+
+    # direct
+    reset(args.rate, ticket_queue)
+    failed = []
+
+    def connect_direct(player):
+        ticket_id = f"ticket-{player}"
+        if not hasattr(containers, 'gamelift'):
+            containers.gamelift = clients.pop()
+        try:
+            containers.gamelift.start_matchmaking(
+                TicketId=ticket_id,
+                ConfigurationName='bench',
+                Players=[{'PlayerId': player, 'PlayerAttributes': {'skill': {'N': 10}}}]
+            )
+        except ClientError:
+            failed.append(player)
+        return (time.monotonic() - burst_start) * 1000
+
+    burst_start = time.monotonic()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        acks = list(executor.map(connect_direct, players))
+    elapsed = time.monotonic() - burst_start
+    delays = [(started - burst_start) * 1000 for started in FakeAws.started.values()]
+    print("direct")
+    print(f"  connect ack ms     {percentiles(acks)}")
+    print(f"  started {len(FakeAws.started)}, failed (told Unauthorized) {len(failed)}, throttled calls {FakeAws.throttled}")
+    print(f"  connect to start ms {percentiles(delays)}")
+    print(f"  throughput {len(FakeAws.started) / elapsed:.0f} tickets/s over {elapsed:.2f} s")
+
+    # queued
+    time.sleep(1)
+    reset(args.rate, ticket_queue)
+    ticket_queue.queue = queue = ticket_queue.LocalQueue()
+    consumers = [load_consumer(i) for i in range(args.consumers)]
+
+    def connect_queued(player):
+        ticket_id = f"ticket-{player}"
+        ticket_queue.submit(ticket_id, player, f"connection-{player}", 10)
+        return (time.monotonic() - burst_start) * 1000
+
+    def consume(consumer):
+        # what the SQS event source mapping does for one concurrent consumer
+        while queue.pending():
+            response = queue.receive_message(QueueUrl=None, MaxNumberOfMessages=10,
+                                             VisibilityTimeout=args.visibility_timeout)
+            messages = response.get('Messages', [])
+            if not messages:
+                time.sleep(0.05)
+                continue
+
+            records = [{'messageId': m['MessageId'], 'receiptHandle': m['ReceiptHandle'], 'body': m['Body']}
+                       for m in messages]
+            result = consumer.lambda_handler({'Records': records}, Context())
+            retried = {failure['itemIdentifier'] for failure in result['batchItemFailures']}
+            for message in messages:
+                if message['MessageId'] not in retried:
+                    queue.delete_message(QueueUrl=None, ReceiptHandle=message['ReceiptHandle'])
+
+    burst_start = time.monotonic()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        acks = list(executor.map(connect_queued, players))
+    threads = [threading.Thread(target=consume, args=(consumer,)) for consumer in consumers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - burst_start
+    delays = [(started - burst_start) * 1000 for started in FakeAws.started.values()]
+    print("queued")
+    print(f"  connect ack ms     {percentiles(acks)}")
+    print(f"  started {len(FakeAws.started)}, failed 0, throttled calls {FakeAws.throttled}")
+    print(f"  connect to start ms {percentiles(delays)}")
+    print(f"  throughput {len(FakeAws.started) / elapsed:.0f} tickets/s over {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Time from a found match to a running server, cold run_task vs the warm pool.
+
+Simulated on a virtual clock: matches arrive at random at --rate per minute,
+warm_pool.LocalEcs runs a task --start-delay seconds after run_task. Without
+the pool every match waits for its task to start, plus the 2 s of
+mm_onmatchrunning before the IP lookup. With the pool a match takes an idle
+task and waits at most the claim agent's poll interval, or starts its own
+task when the pool is empty. The replenisher runs every minute like
+mm_warmpool, sized by warm_pool.target_size from the matches of the last
+MATCH_RATE_WINDOW minutes. The pool costs idle task minutes, reported too.
+
+usage: python benchmarks/warm_pool_bench.py [--rate 0.5 2 8] [--minutes 240] [--start-delay 60]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'common', 'python'))
+
+import warm_pool  # noqa: E402
+
+# mm_onmatchrunning waits this long before the IP lookup
+IP_DELAY = 2
+POLL_INTERVAL = 0.5
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def arrivals(rate, minutes, rng):
+    t = 0.0
+    times = []
+    while True:
+        t += rng.expovariate(rate / 60)
+        if t >= minutes * 60:
+            return times
+        times.append(t)
+
+
+def simulate(times, minutes, start_delay, pool):
+    clock = Clock()
+    ecs = warm_pool.LocalEcs(start_delay=start_delay, clock=clock)
+    # task id -> time it became idle, and tasks still starting
+    idle = {}
+    starting = set()
+    recent = []
+    waits = []
+    idle_seconds = 0.0
+
+    def settle():
+        for task_id in list(starting):
+            if ecs.describe(task_id)['lastStatus'] == 'RUNNING' and clock.now >= ecs.tasks[task_id]['runningAt'] + IP_DELAY:
+                starting.discard(task_id)
+                idle[task_id] = ecs.tasks[task_id]['runningAt'] + IP_DELAY
+
+    def replenish():
+        window = [t for t in recent if t > clock.now - warm_pool.MATCH_RATE_WINDOW * 60]
+        target = warm_pool.target_size(len(window) / warm_pool.MATCH_RATE_WINDOW)
+        missing = target - len(idle) - len(starting)
+        if missing > 0:
+            for task in ecs.run_task(cluster='bench', count=missing, startedBy=warm_pool.POOL_STARTED_BY)['tasks']:
+                starting.add(task['taskArn'].split('/')[-1])
+        for task_id in sorted(idle, key=idle.get)[:max(-missing, 0)]:
+            ecs.stop_task(cluster='bench', task=task_id)
+            del idle[task_id]
+
+    events = [(t, 'match') for t in times]
+    if pool:
+        events += [(m * 60.0, 'replenish') for m in range(minutes)]
+    events.sort()
+
+    for t, kind in events:
+        # idle time of the pool since the last event
+        settle()
+        idle_seconds += sum(t - max(since, clock.now) for since in idle.values() if since < t)
+        clock.now = t
+        settle()
+        if kind == 'replenish':
+            replenish()
+            continue
+
+        recent.append(t)
+        if pool and idle:
+            task_id = min(idle, key=idle.get)
+            del idle[task_id]
+            # the claim agent reads the entry on average half a poll interval later
+            waits.append(POLL_INTERVAL / 2)
+        else:
+            ecs.run_task(cluster='bench', count=1, startedBy='mm_onmatchfound')
+            waits.append(start_delay + IP_DELAY)
+    return waits, idle_seconds / 60, ecs.run_task_calls
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, nargs='+', default=[0.5, 2, 8], help='matches per minute')
+    parser.add_argument('--minutes', type=int, default=240)
+    parser.add_argument('--start-delay', type=float, default=60, help='seconds from run_task to RUNNING')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'rate':>6}{'matches':>9}  {'cold p50/p95 s':>16}  {'pool p50/p95 s':>16}  {'pool hits':>9}  {'idle task min':>13}")
+    for rate in args.rate:
+        rng = random.Random(args.seed)
+        times = arrivals(rate, args.minutes, rng)
+        cold, _, _ = simulate(times, args.minutes, args.start_delay, pool=False)
+        warm, idle_minutes, _ = simulate(times, args.minutes, args.start_delay, pool=True)
+        hits = sum(1 for w in warm if w <= POLL_INTERVAL) / len(warm)
+        print(f"{rate:>6}{len(times):>9}  "
+              f"{statistics.median(cold):>7.1f} /{percentile(cold, 0.95):>7.1f}  "
+              f"{statistics.median(warm):>7.1f} /{percentile(warm, 0.95):>7.1f}  "
+              f"{hits:>8.0%}  {idle_minutes:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
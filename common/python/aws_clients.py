@@ -0,0 +1,90 @@
+"""boto3 clients shared by the handlers, built once per container.
+
+Creating a client resolves the endpoint and loads the service model, and its
+first call opens a new TLS connection, so building them inside lambda_handler
+pays for all of that on every invocation. Clients and resources here are
+created on first use and then reused by every warm invocation, with one
+botocore config tuned for Lambda.
+
+Clients are thread safe and shared by the threads of a container. Resources,
+and the DynamoDB Table objects built from them, are not: the handlers that
+work on a thread pool get one of each per thread.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# connections kept open per client, enough for the handlers that send to many players at once
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "32"))
+# seconds, well below the function timeout so a slow call is retried instead of timing the function out
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "2"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "5"))
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "3"))
+
+CONFIG = Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    retries={
+        'mode': 'adaptive',
+        'max_attempts': AWS_MAX_ATTEMPTS,
+    },
+)
+
+# the default boto3 session is not safe to create clients from several threads
+session = boto3.session.Session()
+lock = threading.Lock()
+clients = {}
+# resources and tables of the current thread
+local = threading.local()
+
+
+def client(service_name, endpoint_url=None):
+    key = (service_name, endpoint_url)
+    result = clients.get(key)
+    if result is None:
+        with lock:
+            result = clients.get(key)
+            if result is None:
+                result = session.client(service_name, endpoint_url=endpoint_url, config=CONFIG)
+                clients[key] = result
+    return result
+
+
+def thread_cache(name):
+    cache = getattr(local, name, None)
+    if cache is None:
+        cache = {}
+        setattr(local, name, cache)
+    return cache
+
+
+def resource(service_name):
+    resources = thread_cache('resources')
+    result = resources.get(service_name)
+    if result is None:
+        with lock:
+            result = session.resource(service_name, config=CONFIG)
+        resources[service_name] = result
+    return result
+
+
+# DynamoDB Table objects are built from the service model each time, keep one per table
+def table(name):
+    tables = thread_cache('tables')
+    result = tables.get(name)
+    if result is None:
+        dynamodb = resource('dynamodb')
+        # the resource classes are built through the shared session
+        with lock:
+            result = dynamodb.Table(name)
+        tables[name] = result
+    return result
+
+
+# Management API client of a websocket API stage, used to reach the connected players
+def gateway(api_id, region, stage):
+    return client('apigatewaymanagementapi', endpoint_url=f"https://{api_id}.execute-api.{region}.amazonaws.com/{stage}")
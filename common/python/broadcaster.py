@@ -0,0 +1,78 @@
+"""Send to the websocket connections of a match at once.
+
+post_to_connection and delete_connection are blocking HTTPS calls, so a loop
+over the players of a match takes one round trip per player. A Broadcaster
+sends to every connection in parallel from a bounded thread pool, over the
+single management API client of the endpoint (aws_clients.gateway). Its
+connection pool holds AWS_MAX_POOL_CONNECTIONS, more than the threads here.
+
+A GoneException only means the player already disconnected. It is counted
+apart from the errors worth logging.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+# calls in flight at once, below AWS_MAX_POOL_CONNECTIONS so no thread waits for a connection
+BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", "16"))
+
+SENT = 'sent'
+GONE = 'gone'
+
+# threads are started on first use and kept by the warm container
+executor = ThreadPoolExecutor(max_workers=BROADCAST_WORKERS, thread_name_prefix='broadcast')
+
+
+class Outcomes:
+    def __init__(self):
+        # connection id -> SENT, GONE or the exception raised
+        self.results = {}
+
+    @property
+    def sent(self):
+        return [c for c, result in self.results.items() if result == SENT]
+
+    @property
+    def gone(self):
+        return [c for c, result in self.results.items() if result == GONE]
+
+    @property
+    def failed(self):
+        return {c: result for c, result in self.results.items() if isinstance(result, Exception)}
+
+    def __repr__(self):
+        return f"{len(self.sent)} sent, {len(self.gone)} gone, {len(self.failed)} failed"
+
+
+class Broadcaster:
+    def __init__(self, api_id, region, stage):
+        self.gateway = aws_clients.gateway(api_id, region, stage)
+
+    def post(self, connection_ids, data):
+        """Post data (serialized to JSON) to every connection."""
+        payload = json.dumps(data)
+        return self.run(lambda c: self.gateway.post_to_connection(ConnectionId=c, Data=payload), connection_ids)
+
+    def delete(self, connection_ids):
+        """Close every connection."""
+        return self.run(lambda c: self.gateway.delete_connection(ConnectionId=c), connection_ids)
+
+    def run(self, call, connection_ids):
+        outcomes = Outcomes()
+        futures = [(c, executor.submit(call, c)) for c in dict.fromkeys(connection_ids)]
+        for connection_id, future in futures:
+            try:
+                future.result()
+                outcomes.results[connection_id] = SENT
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'GoneException':
+                    outcomes.results[connection_id] = GONE
+                else:
+                    outcomes.results[connection_id] = e
+            except Exception as e:
+                outcomes.results[connection_id] = e
+        return outcomes
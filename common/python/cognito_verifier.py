@@ -0,0 +1,384 @@
+"""Verification of Cognito RS256 tokens.
+
+Only depends on the standard library and cryptography, so importing it is
+much cheaper than jwt + requests on cold start. Shared through the common
+layer, mm_onconnect checks the token of the websocket $connect with it. The
+REST API functions get their claims from its Cognito authorizer instead.
+"""
+import base64
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from ttl_cache import TtlCache
+
+# Set up your Cognito pool data
+COGNITO_USER_POOL_ID = os.environ.get("COGNITO_USER_POOL_ID")
+COGNITO_REGION = os.environ.get("COGNITO_REGION")
+COGNITO_APP_CLIENT_ID = os.environ.get("COGNITO_USER_POOL_CLIENT_ID")
+COGNITO_POOL_ISSUER = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
+JWKS_URL = os.environ.get("COGNITO_JWKS_URL", f"{COGNITO_POOL_ISSUER}/.well-known/jwks.json")
+# how long (in seconds) the fetched key set stays valid, it is refreshed in the background at half this
+JWKS_LIFESPAN = int(os.environ.get("JWKS_LIFESPAN", "3600"))
+# key set bundled in the layer at build time by auth_dependencies/snapshot_jwks.bat
+JWKS_SNAPSHOT = os.environ.get("JWKS_SNAPSHOT", "/opt/python/cognito_jwks.json")
+JWKS_TIMEOUT = int(os.environ.get("JWKS_TIMEOUT", "5"))
+# minimum seconds between two fetches triggered by tokens, and how long an unknown kid is remembered
+JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get("JWKS_MIN_REFRESH_INTERVAL", "10"))
+UNKNOWN_KID_TTL = int(os.environ.get("UNKNOWN_KID_TTL", "60"))
+UNKNOWN_KID_MAX = 1024
+MAX_AGE_RE = re.compile(r"\bmax-age=(\d+)", re.IGNORECASE)
+# verified tokens kept in memory, each one until its exp or at most CLAIMS_CACHE_MAX_TTL seconds
+CLAIMS_CACHE_SIZE = int(os.environ.get("CLAIMS_CACHE_SIZE", "1024"))
+CLAIMS_CACHE_MAX_TTL = int(os.environ.get("CLAIMS_CACHE_MAX_TTL", "3600"))
+# threads used by verify_many, the RSA verify releases the GIL
+VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", str(os.cpu_count() or 1)))
+
+
+class TokenError(Exception):
+    pass
+
+
+def b64decode(segment):
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+# Split a token into its header, claims, signed part and signature, without verifying anything
+def parse_token(token):
+    try:
+        if isinstance(token, str):
+            token = token.encode('ascii')
+        signing_input, signature = token.rsplit(b'.', 1)
+        header_segment, claims_segment = signing_input.split(b'.', 1)
+        header = json.loads(b64decode(header_segment))
+        claims = json.loads(b64decode(claims_segment))
+        signature = b64decode(signature)
+    except ValueError as e:
+        raise TokenError("Unable to decode token") from e
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenError("Unable to decode token")
+
+    return header, claims, signing_input, signature
+
+
+def get_unverified_claims(token):
+    return parse_token(token)[1]
+
+
+# max-age of a response, None when absent or when the response must not be cached
+def get_max_age(headers):
+    cache_control = headers.get('Cache-Control', '')
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return None
+
+    match = MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else None
+
+
+def build_public_key(jwk):
+    n = int.from_bytes(b64decode(jwk['n'].encode('ascii')), 'big')
+    e = int.from_bytes(b64decode(jwk['e'].encode('ascii')), 'big')
+    return rsa.RSAPublicNumbers(e, n).public_key()
+
+
+# RSA public keys of the user pool, by kid
+class KeyStore:
+    def __init__(self, url, lifespan, min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 unknown_kid_ttl=UNKNOWN_KID_TTL):
+        self.url = url
+        self.lifespan = lifespan
+        self.min_refresh_interval = min_refresh_interval
+        self.unknown_kid_ttl = unknown_kid_ttl
+        self.keys = {}
+        self.jwks = {}
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        # only one fetch in flight, callers arriving meanwhile share its result
+        self.fetch_lock = threading.Lock()
+        self.last_fetch = float('-inf')
+        self.unknown_kids = {}
+        # keep-alive connection to the JWKS host and validators of the last response,
+        # so an unchanged key set costs a 304 on a warm socket
+        self.connection = None
+        self.etag = None
+        self.last_modified = None
+        self.validated_jwks = None
+
+    def load(self, jwks, lifespan=None):
+        keys = {}
+        key_data = {}
+        for jwk in jwks.get('keys', []):
+            kid = jwk.get('kid')
+            if jwk.get('kty') != 'RSA' or jwk.get('use', 'sig') != 'sig' or not kid:
+                continue
+
+            # keep the prepared key when the kid didn't change
+            if self.jwks.get(kid) == jwk:
+                keys[kid] = self.keys[kid]
+            else:
+                try:
+                    keys[kid] = build_public_key(jwk)
+                except (KeyError, ValueError) as e:
+                    print(f"Skipping unusable key {kid}: {e}")
+                    continue
+            key_data[kid] = jwk
+
+        if not keys:
+            raise TokenError("The key set did not contain any usable keys")
+
+        with self.lock:
+            self.keys = keys
+            self.jwks = key_data
+            if lifespan is None:
+                lifespan = self.lifespan
+            # a negative lifespan means the keys never expire
+            self.expires_at = float('inf') if lifespan < 0 else time.monotonic() + lifespan
+
+    # Fetch the key set, unless a fetch completed while waiting for the one in flight.
+    # With wait=False, return False right away if a fetch is already in flight
+    def fetch(self, wait=True):
+        started = time.monotonic()
+        if not self.fetch_lock.acquire(blocking=wait):
+            return False
+
+        try:
+            if self.last_fetch >= started:
+                return True
+
+            headers = {}
+            if self.validated_jwks is not None:
+                if self.etag:
+                    headers['If-None-Match'] = self.etag
+                if self.last_modified:
+                    headers['If-Modified-Since'] = self.last_modified
+
+            try:
+                status, response_headers, body = self.http_get(headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # the kept-alive connection was closed by the server since the last fetch
+                status, response_headers, body = self.http_get(headers)
+
+            if status == 304 and self.validated_jwks is not None:
+                jwks = self.validated_jwks
+            elif status == 200:
+                jwks = json.loads(body)
+                self.etag = response_headers.get('ETag')
+                self.last_modified = response_headers.get('Last-Modified')
+                self.validated_jwks = jwks
+            else:
+                raise TokenError(f"Unable to fetch Cognito public keys, HTTP {status}")
+
+            # the server's max-age takes precedence over JWKS_LIFESPAN
+            self.load(jwks, lifespan=get_max_age(response_headers))
+            return True
+        finally:
+            self.last_fetch = time.monotonic()
+            self.fetch_lock.release()
+
+    def http_get(self, headers):
+        url = urllib.parse.urlsplit(self.url)
+        if self.connection is None:
+            if url.scheme == 'https':
+                self.connection = http.client.HTTPSConnection(url.netloc, timeout=JWKS_TIMEOUT)
+            else:
+                self.connection = http.client.HTTPConnection(url.netloc, timeout=JWKS_TIMEOUT)
+
+        try:
+            self.connection.request('GET', url.path or '/', headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.headers, response.read()
+        except Exception:
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def can_fetch(self):
+        return self.fetch_lock.locked() or time.monotonic() - self.last_fetch >= self.min_refresh_interval
+
+    def load_snapshot(self, path):
+        try:
+            with open(path) as f:
+                jwks = json.load(f)
+            # bundled keys never expire, a token with an unknown kid still triggers a live fetch
+            self.load(jwks, lifespan=-1)
+        except (OSError, ValueError, TokenError) as e:
+            print(f"No JWKS snapshot loaded {e}")
+            return False
+        return True
+
+    # Refresh the key set, then schedule the next refresh before the fetched one expires
+    def refresh(self):
+        try:
+            self.fetch()
+        except Exception as e:
+            print(f"Error refreshing JWKS {e}")
+
+        timer = threading.Timer(self.lifespan / 2, self.refresh)
+        timer.daemon = True
+        timer.start()
+
+    def refresh_stale(self):
+        try:
+            self.fetch(wait=False)
+        except Exception as e:
+            print(f"Error refreshing JWKS {e}")
+
+    def get_key(self, kid):
+        if time.monotonic() > self.expires_at and self.can_fetch():
+            if self.keys:
+                # keep serving the current keys while they are refreshed in the background
+                if not self.fetch_lock.locked():
+                    threading.Thread(target=self.refresh_stale, daemon=True).start()
+            else:
+                try:
+                    self.fetch()
+                except Exception as e:
+                    print(f"Error refreshing JWKS {e}")
+
+        key = self.keys.get(kid)
+        if key is None:
+            key = self.get_unknown_key(kid)
+
+        return key
+
+    # The pool may have rotated its keys, fetch once more unless this kid is known to be missing
+    def get_unknown_key(self, kid):
+        if self.unknown_kids.get(kid, 0) > time.monotonic() or not self.can_fetch():
+            raise TokenError("Unable to find appropriate key")
+
+        try:
+            self.fetch()
+        except Exception as e:
+            raise TokenError("Unable to fetch Cognito public keys") from e
+
+        key = self.keys.get(kid)
+        if key is None:
+            if len(self.unknown_kids) >= UNKNOWN_KID_MAX:
+                self.unknown_kids.clear()
+            self.unknown_kids[kid] = time.monotonic() + self.unknown_kid_ttl
+            raise TokenError("Unable to find appropriate key")
+
+        return key
+
+
+key_store = KeyStore(JWKS_URL, JWKS_LIFESPAN)
+# verified claims, keyed by the sha256 digest of the raw token
+claims_cache = TtlCache(CLAIMS_CACHE_SIZE, CLAIMS_CACHE_MAX_TTL)
+
+
+# Check everything but the signature, cheap enough to run before the RSA verify
+def check_claims(header, claims):
+    # the kid is a key of the key store and of the groups of verify_many, a list or dict in its place is malformed
+    if header.get('alg') != 'RS256' or not isinstance(header.get('kid'), str):
+        raise TokenError("Authorization malformed")
+
+    if claims.get('iss') != COGNITO_POOL_ISSUER:
+        raise TokenError("Invalid issuer")
+
+    # id tokens carry the app client in aud, access tokens in client_id
+    token_use = claims.get('token_use')
+    if token_use == 'id':
+        audience = claims.get('aud')
+    elif token_use == 'access':
+        audience = claims.get('client_id')
+    else:
+        raise TokenError("Invalid token_use")
+
+    if audience != COGNITO_APP_CLIENT_ID:
+        raise TokenError("Invalid audience")
+
+    exp = claims.get('exp')
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        raise TokenError("Token is expired")
+
+
+def verify_signature(key, signing_input, signature):
+    try:
+        key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature as e:
+        raise TokenError("Invalid signature") from e
+
+
+# Verify a Cognito token and return its claims, raise TokenError otherwise
+def verify_token(token):
+    cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+    claims = claims_cache.get(cache_key)
+    if claims is not None:
+        return claims
+
+    header, claims, signing_input, signature = parse_token(token)
+    check_claims(header, claims)
+    verify_signature(key_store.get_key(header['kid']), signing_input, signature)
+
+    claims_cache.put(cache_key, claims, claims['exp'])
+    return claims
+
+
+# Verify a batch of tokens, returns a list in input order holding the claims or the TokenError of each token
+def verify_many(tokens, max_workers=VERIFY_WORKERS):
+    results = [None] * len(tokens)
+
+    # parse and check everything but the signature, grouping the tokens by kid
+    groups = {}
+    for i, token in enumerate(tokens):
+        try:
+            cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+            claims = claims_cache.get(cache_key)
+            if claims is not None:
+                results[i] = claims
+                continue
+
+            header, claims, signing_input, signature = parse_token(token)
+            check_claims(header, claims)
+        except TokenError as e:
+            results[i] = e
+            continue
+
+        groups.setdefault(header['kid'], []).append((i, cache_key, claims, signing_input, signature))
+
+    # one key lookup per kid
+    jobs = []
+    for kid, group in groups.items():
+        try:
+            key = key_store.get_key(kid)
+        except TokenError as e:
+            for item in group:
+                results[item[0]] = e
+            continue
+        jobs += [(key, item) for item in group]
+
+    def verify_chunk(chunk):
+        for key, (i, cache_key, claims, signing_input, signature) in chunk:
+            try:
+                verify_signature(key, signing_input, signature)
+            except TokenError as e:
+                results[i] = e
+                continue
+            claims_cache.put(cache_key, claims, claims['exp'])
+            results[i] = claims
+
+    # one chunk per thread, a task per token costs about as much as the verify itself
+    workers = max(1, min(max_workers, len(jobs)))
+    if workers == 1:
+        verify_chunk(jobs)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(verify_chunk, [jobs[w::workers] for w in range(workers)]))
+
+    return results
+
+
+# Fall back to prefetching during init so warm invocations are served from memory
+if not key_store.load_snapshot(JWKS_SNAPSHOT):
+    key_store.refresh()
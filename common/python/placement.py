@@ -0,0 +1,161 @@
+"""Slots of the game server tasks, so that one task hosts several matches.
+
+A task runs up to SLOTS_PER_TASK servers, the one of slot s listening on UDP
+port BASE_PORT + s. Each task has an entry in SERVER_TASKS_TABLE with its
+free slots (a number set), the match of each taken slot and the number of
+slots taken. mm_onmatchfound places a new match in the fullest open task that
+still has a slot (best fit, so the emptiest tasks drain and close), and
+launches or claims a task only when every task is full. The claim agent of
+the task starts a server for each match written in its entry, and the slot
+is released when the match result is posted or its server exits.
+
+Taking a slot is a conditional update on the free slots, so two matches never
+get the same port. The status index is eventually consistent, it only picks
+the candidates.
+
+With one slot per task (the default, DuoBoloServer listens on 13333 and has
+to take its port from PORT for more) nothing is written here.
+"""
+import os
+import time
+
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+SERVER_TASKS_TABLE = os.environ.get("SERVER_TASKS_TABLE")
+# status, by slots taken
+OPEN_INDEX = 'status-used-index'
+SLOTS_PER_TASK = int(os.environ.get("SLOTS_PER_TASK", "1"))
+BASE_PORT = 13333
+# seconds without a heartbeat of its claim agent before a task gets no new match
+HEARTBEAT_TIMEOUT = 90
+# a task just launched has no agent yet, it has this long to start
+START_GRACE = 300
+TASK_TTL = 24 * 3600
+# open tasks tried by a placement
+PLACE_CANDIDATES = 10
+
+OPEN = 'open'
+CLOSED = 'closed'
+
+
+def enabled():
+    return SLOTS_PER_TASK > 1
+
+
+def port(slot):
+    return BASE_PORT + slot
+
+
+def table():
+    return aws_clients.table(SERVER_TASKS_TABLE)
+
+
+def is_conditional_check_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# A task starts hosting a match in slot 0, ip is None until mm_onmatchrunning sees it run
+def register(task_id, match_id, ip=None):
+    now = int(time.time())
+    item = {
+        'taskId': task_id,
+        'status': OPEN,
+        'used': 1,
+        'matches': {'0': match_id},
+        'heartbeat': now + START_GRACE,
+        'expirationTime': now + TASK_TTL
+    }
+    if SLOTS_PER_TASK > 1:
+        item['free'] = set(range(1, SLOTS_PER_TASK))
+    if ip:
+        item['ip'] = ip
+    table().put_item(Item=item)
+    return 0
+
+
+# Put the match in a slot of an open task, returns (task id, slot, ip or None) or None when all are full
+def place(match_id):
+    response = table().query(
+        IndexName=OPEN_INDEX,
+        KeyConditionExpression=Key('status').eq(OPEN) & Key('used').lt(SLOTS_PER_TASK),
+        FilterExpression=Attr('heartbeat').gte(int(time.time()) - HEARTBEAT_TIMEOUT),
+        # fullest first
+        ScanIndexForward=False,
+        Limit=PLACE_CANDIDATES
+    )
+    for entry in response['Items']:
+        for slot in sorted(entry.get('free', ())):
+            slot = int(slot)
+            try:
+                updated = table().update_item(
+                    Key={
+                        'taskId': entry['taskId']
+                    },
+                    UpdateExpression='DELETE free :slots ADD used :one SET matches.#slot = :match',
+                    ConditionExpression='#status = :open AND contains(free, :slot)',
+                    ExpressionAttributeNames={'#status': 'status', '#slot': str(slot)},
+                    ExpressionAttributeValues={
+                        ':slots': {slot},
+                        ':slot': slot,
+                        ':one': 1,
+                        ':open': OPEN,
+                        ':match': match_id
+                    },
+                    ReturnValues='ALL_NEW'
+                )
+            except ClientError as e:
+                if is_conditional_check_failure(e):
+                    # taken meanwhile, or the task closed
+                    continue
+                raise
+            return entry['taskId'], slot, updated['Attributes'].get('ip')
+    return None
+
+
+# Give the slot back, False if it did not hold this match any more
+def release(task_id, slot, match_id):
+    try:
+        table().update_item(
+            Key={
+                'taskId': task_id
+            },
+            UpdateExpression='ADD free :slots, used :minus_one REMOVE matches.#slot',
+            ConditionExpression='matches.#slot = :match',
+            ExpressionAttributeNames={'#slot': str(slot)},
+            ExpressionAttributeValues={
+                ':slots': {int(slot)},
+                ':minus_one': -1,
+                ':match': match_id
+            }
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
+
+
+# The task runs with this IP, False if it hosts no slots
+def set_ip(task_id, ip):
+    try:
+        table().update_item(
+            Key={
+                'taskId': task_id
+            },
+            UpdateExpression='SET ip = :ip',
+            ConditionExpression='attribute_exists(taskId)',
+            ExpressionAttributeValues={':ip': ip}
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
+
+
+def ip_of(task_id):
+    item = table().get_item(Key={'taskId': task_id}, ConsistentRead=True).get('Item')
+    return item.get('ip') if item else None
@@ -0,0 +1,122 @@
+"""Matchmaking tickets waiting to be submitted to GameLift.
+
+mm_onconnect puts the ticket on an SQS queue and answers the player right
+away. mm_submitticket drains the queue through a token bucket at the rate
+StartMatchmaking sustains, so a burst of connects waits in the queue instead
+of being throttled, and throttled tickets go back to it to be retried.
+
+LocalQueue stands in for SQS when there is no queue to talk to (set
+ticket_queue.queue to one).
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import aws_clients
+
+TICKET_QUEUE_URL = os.environ.get("TICKET_QUEUE_URL")
+
+# stand-in used instead of SQS when set
+queue = None
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Take a token, returns 0 or the seconds until one is available
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    # Wait for a token, False if none is available within timeout seconds
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# In memory queue with the part of the SQS API used here, including visibility timeouts
+class LocalQueue:
+    def __init__(self):
+        self.messages = deque()
+        self.in_flight = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.deleted = 0
+
+    def send_message(self, QueueUrl, MessageBody):
+        message_id = str(next(self.ids))
+        with self.lock:
+            self.messages.append({'MessageId': message_id, 'Body': MessageBody, 'ReceiveCount': 0})
+            self.sent += 1
+        return {'MessageId': message_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, VisibilityTimeout=30):
+        now = time.monotonic()
+        received = []
+        with self.lock:
+            # messages not deleted before their visibility timeout go back to the queue
+            for receipt_handle, (visible_at, message) in list(self.in_flight.items()):
+                if visible_at <= now:
+                    del self.in_flight[receipt_handle]
+                    self.messages.append(message)
+
+            while self.messages and len(received) < MaxNumberOfMessages:
+                message = self.messages.popleft()
+                message['ReceiveCount'] += 1
+                receipt_handle = f"{message['MessageId']}-{message['ReceiveCount']}"
+                self.in_flight[receipt_handle] = (now + VisibilityTimeout, message)
+                received.append({
+                    'MessageId': message['MessageId'],
+                    'ReceiptHandle': receipt_handle,
+                    'Body': message['Body'],
+                    'Attributes': {'ApproximateReceiveCount': str(message['ReceiveCount'])}
+                })
+
+        return {'Messages': received} if received else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        with self.lock:
+            if self.in_flight.pop(ReceiptHandle, None) is not None:
+                self.deleted += 1
+
+    def pending(self):
+        with self.lock:
+            return len(self.messages) + len(self.in_flight)
+
+
+def client():
+    return queue if queue is not None else aws_clients.client('sqs')
+
+
+def submit(ticket_id, player_id, connection_id, skill):
+    client().send_message(
+        QueueUrl=TICKET_QUEUE_URL,
+        MessageBody=json.dumps({
+            'ticketId': ticket_id,
+            'playerId': player_id,
+            'connectionId': connection_id,
+            'skill': skill,
+            'queuedAt': time.time()
+        })
+    )
@@ -0,0 +1,213 @@
+"""Matchmaking ticket of each queued player, and the connection to notify.
+
+A ticket id is derived from the connection that started it, so without this a
+player who drops and reconnects gets a new ticket and loses their wait time.
+mm_onconnect registers the ticket it starts, or moves an in-flight one to the
+new connection. The old connection's $disconnect usually comes first, so
+mm_ondisconnect only detaches the entry: the player has RECONNECT_GRACE
+seconds to reattach, and mm_releaseticket stops the ticket once they are over
+unless the player did. The match event handlers resolve the connections here
+and remove the entries.
+
+srv_postmatchresult also marks the player's entry with resultAt, creating it
+if the player is not queued. mm_onconnect learns from its reattach or
+register of the entry, at no extra read, that its cached profile of the
+player is older than the result. An entry with no ticket is only that mark.
+"""
+import base64
+import os
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+ACTIVE_TICKETS_TABLE = os.environ.get("ACTIVE_TICKETS_TABLE")
+CONNECTION_INDEX = 'connectionId-index'
+# seconds an entry outlives its ticket if no event removes it, above the configuration's RequestTimeoutSeconds
+ACTIVE_TICKET_TTL = int(os.environ.get("ACTIVE_TICKET_TTL", "600"))
+# seconds a disconnected player has to reattach to their ticket, at most the 900 of an SQS message delay
+RECONNECT_GRACE = int(os.environ.get("RECONNECT_GRACE", "30"))
+
+
+def ticket_id_for(connection_id):
+    return base64.b16encode(connection_id.encode('utf-8')).decode('utf-8')
+
+
+def connection_id_for(ticket_id):
+    return base64.b16decode(ticket_id.encode('utf-8')).decode('utf-8')
+
+
+def table():
+    return aws_clients.table(ACTIVE_TICKETS_TABLE)
+
+
+def is_conditional_check_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# Returns whether the entry replaced carried a match result
+def register(player_id, ticket_id, connection_id):
+    response = table().put_item(
+        Item={
+            'playerId': player_id,
+            'ticketId': ticket_id,
+            'connectionId': connection_id,
+            'expirationTime': int(time.time()) + ACTIVE_TICKET_TTL
+        },
+        ReturnValues='ALL_OLD'
+    )
+    return 'resultAt' in response.get('Attributes', {})
+
+
+# Move the player's in-flight ticket to a new connection. Returns its id, or None if there is none
+# and whether a match result of the player was posted since their last ticket
+def reattach(player_id, connection_id):
+    try:
+        response = table().update_item(
+            Key={
+                'playerId': player_id
+            },
+            UpdateExpression='SET connectionId = :connectionId REMOVE reattachBefore',
+            # DynamoDB can keep expired items for a while after their TTL, and a detached ticket is only kept for its grace period
+            ConditionExpression='attribute_exists(ticketId) AND expirationTime > :now '
+                                'AND (attribute_not_exists(reattachBefore) OR reattachBefore > :now)',
+            ExpressionAttributeValues={
+                ':connectionId': connection_id,
+                ':now': int(time.time())
+            },
+            ReturnValues='ALL_NEW',
+            # the entry that failed the condition, its result mark comes with the error
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return None, 'resultAt' in e.response.get('Item', {})
+        raise
+
+    return response['Attributes']['ticketId'], False
+
+
+# The connection went away, its ticket waits RECONNECT_GRACE seconds for a reattach, returns its id or None
+def detach(player_id, connection_id):
+    try:
+        response = table().update_item(
+            Key={
+                'playerId': player_id
+            },
+            UpdateExpression='SET reattachBefore = :reattachBefore',
+            ConditionExpression='connectionId = :connectionId',
+            ExpressionAttributeValues={
+                ':connectionId': connection_id,
+                ':reattachBefore': int(time.time()) + RECONNECT_GRACE
+            },
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+
+    return response['Attributes']['ticketId']
+
+
+# The grace period of a detached connection is over, returns whether its ticket is to be stopped
+def expire(player_id, ticket_id, connection_id):
+    if release_connection(player_id, connection_id) is not None:
+        return True
+    # reattached from another connection, or replaced by a new ticket the old one must not outlive
+    return not is_active(player_id, ticket_id)
+
+
+# Player registered with a connection, through an eventually consistent index
+def find_player(connection_id):
+    response = table().query(
+        IndexName=CONNECTION_INDEX,
+        KeyConditionExpression=Key('connectionId').eq(connection_id),
+        Limit=1
+    )
+
+    items = response.get('Items', [])
+    return items[0]['playerId'] if items else None
+
+
+# Remove the player's entry if it still belongs to the connection, returns its ticket id if it did
+def release_connection(player_id, connection_id):
+    try:
+        response = table().delete_item(
+            Key={
+                'playerId': player_id
+            },
+            ConditionExpression='connectionId = :connectionId',
+            ExpressionAttributeValues={
+                ':connectionId': connection_id
+            },
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+
+    return response['Attributes']['ticketId']
+
+
+# Whether the ticket is still the one the player waits on, it is not once they disconnected
+def is_active(player_id, ticket_id):
+    response = table().get_item(
+        Key={
+            'playerId': player_id
+        },
+        ConsistentRead=True
+    )
+
+    item = response.get('Item')
+    return item is not None and item.get('ticketId') == ticket_id
+
+
+# Connection to notify about a ticket, the registered one or the one that started it
+def resolve_connection(player_id, ticket_id):
+    response = table().get_item(
+        Key={
+            'playerId': player_id
+        },
+        ConsistentRead=True
+    )
+
+    item = response.get('Item')
+    if item is not None and item.get('ticketId') == ticket_id:
+        return item['connectionId']
+
+    return connection_id_for(ticket_id)
+
+
+# The ticket ended (matched, timed out or failed), remove the entry unless a new ticket replaced it
+def remove(player_id, ticket_id):
+    try:
+        table().delete_item(
+            Key={
+                'playerId': player_id
+            },
+            ConditionExpression='ticketId = :ticketId',
+            ExpressionAttributeValues={
+                ':ticketId': ticket_id
+            }
+        )
+    except ClientError as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+# A match result of the player was posted, their profile cached by mm_onconnect is out of date
+def mark_result(player_id):
+    table().update_item(
+        Key={
+            'playerId': player_id
+        },
+        UpdateExpression='SET resultAt = :now, expirationTime = if_not_exists(expirationTime, :expirationTime)',
+        ExpressionAttributeValues={
+            ':now': int(time.time()),
+            ':expirationTime': int(time.time()) + ACTIVE_TICKET_TTL
+        }
+    )
@@ -0,0 +1,52 @@
+"""In-memory LRU cache whose entries expire, kept by a warm container.
+
+cognito_verifier keeps the verified tokens in one until their exp, and
+mm_onconnect the skill inputs of the players it saw. Expiry times are wall
+clock seconds, so an entry can expire with the token it came from.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TtlCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # Keep the value ttl seconds, or until expires_at if that comes first
+    def put(self, key, value, expires_at=None):
+        expires_at = min(expires_at, time.time() + self.ttl) if expires_at is not None else time.time() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries)
+        }
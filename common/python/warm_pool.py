@@ -0,0 +1,275 @@
+"""Game server tasks started ahead of the matches, with their IP already known.
+
+A new match otherwise waits for a whole run_task: image pull, container start
+and ENI attach, then the IP lookup of mm_onmatchrunning. mm_warmpool keeps a
+few tasks started without a MATCH_ID. Their claim agent (claim_agent.py of
+the game server image) waits for a match before starting DuoBoloServer.
+
+An entry goes starting (mm_warmpool launched it), then idle (mm_onmatchrunning
+saw it run and recorded its IP), then claimed (mm_onmatchfound gave it a
+match), or retired (scaled down). Every move is a conditional update, so a
+task is claimed by one match only. mm_onmatchfound also counts the matches
+per minute, and mm_warmpool sizes the pool from that rate.
+
+The tasks mm_onmatchfound launches together in one run_task share their
+overrides, so they get no MATCH_ID either. Each gets a claimed entry right
+away, and its claim agent starts the server as for a pool task.
+
+LocalEcs stands in for ECS when there is no cluster to talk to (set
+warm_pool.ecs to one).
+"""
+import itertools
+import math
+import os
+import random
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+WARM_POOL_TABLE = os.environ.get("WARM_POOL_TABLE")
+STATUS_INDEX = 'status-index'
+# startedBy of the pool tasks, the tasks launched for a match have none of it
+POOL_STARTED_BY = 'mm_warmpool'
+
+# idle tasks kept whatever the rate, and at most
+WARM_POOL_MIN = int(os.environ.get("WARM_POOL_MIN", "1"))
+WARM_POOL_MAX = int(os.environ.get("WARM_POOL_MAX", "10"))
+# minutes for a new task to become idle, the pool has to cover the matches found meanwhile
+WARM_POOL_LEAD_MINUTES = float(os.environ.get("WARM_POOL_LEAD_MINUTES", "2"))
+# minutes the match rate is averaged over
+MATCH_RATE_WINDOW = int(os.environ.get("MATCH_RATE_WINDOW", "10"))
+# seconds an entry outlives its task if nothing removes it
+STARTING_TTL = 600
+POOL_TASK_TTL = 24 * 3600
+# idle entries tried by a claim, picked at random so concurrent claims rarely collide
+CLAIM_CANDIDATES = 10
+
+STARTING = 'starting'
+IDLE = 'idle'
+CLAIMED = 'claimed'
+RETIRED = 'retired'
+
+# stand-in used instead of ECS when set
+ecs = None
+
+
+# In memory cluster with the part of the ECS API used here, tasks run start_delay seconds after run_task
+class LocalEcs:
+    def __init__(self, start_delay=60, clock=time.time):
+        self.start_delay = start_delay
+        self.clock = clock
+        self.tasks = {}
+        self.ids = itertools.count(1)
+        self.run_task_calls = 0
+
+    def run_task(self, cluster=None, count=1, startedBy=None, overrides=None, **kwargs):
+        self.run_task_calls += 1
+        environment = {}
+        for container in (overrides or {}).get('containerOverrides', []):
+            environment.update({e['name']: e['value'] for e in container.get('environment', [])})
+
+        tasks = []
+        for _ in range(count):
+            n = next(self.ids)
+            task_id = f"{n:032x}"
+            task = {
+                'taskArn': f"arn:aws:ecs:local:000000000000:task/{cluster}/{task_id}",
+                'startedBy': startedBy,
+                'environment': environment,
+                'runningAt': self.clock() + self.start_delay,
+                'stopped': False,
+                'privateIp': f"10.0.{n // 256 % 256}.{n % 256}",
+            }
+            self.tasks[task_id] = task
+            tasks.append(self.describe(task_id))
+        return {'tasks': tasks, 'failures': []}
+
+    def stop_task(self, cluster=None, task=None, reason=None):
+        self.tasks[task.split('/')[-1]]['stopped'] = True
+        return {'task': self.describe(task.split('/')[-1])}
+
+    def list_tasks(self, cluster=None, startedBy=None, desiredStatus='RUNNING', nextToken=None):
+        return {'taskArns': [
+            task['taskArn'] for task in self.tasks.values()
+            if (startedBy is None or task['startedBy'] == startedBy)
+            and task['stopped'] == (desiredStatus == 'STOPPED')
+        ]}
+
+    def describe_tasks(self, cluster=None, tasks=()):
+        return {'tasks': [self.describe(task.split('/')[-1]) for task in tasks if task.split('/')[-1] in self.tasks]}
+
+    def describe(self, task_id):
+        task = self.tasks[task_id]
+        if task['stopped']:
+            status = 'STOPPED'
+        elif self.clock() >= task['runningAt']:
+            status = 'RUNNING'
+        else:
+            status = 'PROVISIONING'
+        return {
+            'taskArn': task['taskArn'],
+            'startedBy': task['startedBy'],
+            'lastStatus': status,
+            'desiredStatus': 'STOPPED' if task['stopped'] else 'RUNNING',
+            'attachments': [{'type': 'ElasticNetworkInterface', 'details': [
+                {'name': 'subnetId', 'value': 'subnet-local'},
+                {'name': 'networkInterfaceId', 'value': f"eni-{task_id[-17:]}"},
+                {'name': 'privateIPv4Address', 'value': task['privateIp']},
+            ]}],
+            'containers': [{'name': 'container', 'networkInterfaces': [{'privateIpv4Address': task['privateIp']}]}],
+        }
+
+
+def client():
+    return ecs if ecs is not None else aws_clients.client('ecs')
+
+
+def table():
+    return aws_clients.table(WARM_POOL_TABLE)
+
+
+def is_conditional_check_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# Move an entry from one status to another, False if it was not in that status any more
+def move(task_id, from_status, to_status, **attributes):
+    names = {'#status': 'status'}
+    values = {':from': from_status, ':to': to_status}
+    update = 'SET #status = :to'
+    for name, value in attributes.items():
+        update += f", #{name} = :{name}"
+        names[f"#{name}"] = name
+        values[f":{name}"] = value
+    try:
+        table().update_item(
+            Key={
+                'taskId': task_id
+            },
+            UpdateExpression=update,
+            ConditionExpression='#status = :from',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
+
+
+def add_starting(task_id):
+    table().put_item(
+        Item={
+            'taskId': task_id,
+            'status': STARTING,
+            'startedAt': int(time.time()),
+            'expirationTime': int(time.time()) + STARTING_TTL
+        }
+    )
+
+
+# The pool task runs with this IP, False if it is not a starting pool task
+def mark_idle(task_id, ip):
+    return move(task_id, STARTING, IDLE, ip=ip, idleSince=int(time.time()),
+                expirationTime=int(time.time()) + POOL_TASK_TTL)
+
+
+# Give an idle task to the match, returns its entry or None if the pool is empty
+def claim(match_id):
+    # the index is eventually consistent, the conditional update is what makes the claim exclusive
+    response = table().query(
+        IndexName=STATUS_INDEX,
+        KeyConditionExpression=Key('status').eq(IDLE),
+        Limit=CLAIM_CANDIDATES
+    )
+    candidates = response['Items']
+    random.shuffle(candidates)
+    for entry in candidates:
+        if move(entry['taskId'], IDLE, CLAIMED, matchId=match_id, claimedAt=int(time.time())):
+            return entry
+    return None
+
+
+# A task launched with others for a match, it has no MATCH_ID and waits for its claim like a pool task
+def add_claimed(task_id, match_id):
+    table().put_item(
+        Item={
+            'taskId': task_id,
+            'status': CLAIMED,
+            'matchId': match_id,
+            'claimedAt': int(time.time()),
+            'expirationTime': int(time.time()) + POOL_TASK_TTL
+        }
+    )
+
+
+def retire(task_id):
+    return move(task_id, IDLE, RETIRED)
+
+
+def entries(status):
+    items = []
+    kwargs = {}
+    while True:
+        response = table().query(
+            IndexName=STATUS_INDEX,
+            KeyConditionExpression=Key('status').eq(status),
+            **kwargs
+        )
+        items += response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def forget(task_id, status):
+    try:
+        table().delete_item(
+            Key={
+                'taskId': task_id
+            },
+            ConditionExpression='#status = :status',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': status}
+        )
+    except ClientError as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+# Matches of each minute are counted in entries of their own, they have no status so stay out of the index
+def rate_key(minute):
+    return f"rate#{minute}"
+
+
+def record_match():
+    minute = int(time.time() // 60)
+    table().update_item(
+        Key={
+            'taskId': rate_key(minute)
+        },
+        UpdateExpression='ADD matches :one SET expirationTime = :expirationTime',
+        ExpressionAttributeValues={
+            ':one': 1,
+            ':expirationTime': (minute + MATCH_RATE_WINDOW + 1) * 60
+        }
+    )
+
+
+# Matches per minute over the last MATCH_RATE_WINDOW full minutes
+def match_rate():
+    minute = int(time.time() // 60)
+    keys = [{'taskId': rate_key(m)} for m in range(minute - MATCH_RATE_WINDOW, minute)]
+    response = aws_clients.resource('dynamodb').batch_get_item(
+        RequestItems={WARM_POOL_TABLE: {'Keys': keys, 'ProjectionExpression': 'matches'}}
+    )
+    return sum(int(item['matches']) for item in response['Responses'][WARM_POOL_TABLE]) / MATCH_RATE_WINDOW
+
+
+# Idle and starting tasks to keep for a match rate, enough for the matches found while a new task starts
+def target_size(rate, minimum=WARM_POOL_MIN, maximum=WARM_POOL_MAX, lead_minutes=WARM_POOL_LEAD_MINUTES):
+    return max(minimum, min(maximum, math.ceil(rate * lead_minutes) + minimum))
@@ -0,0 +1,176 @@
+"""Entry point of the game server container.
+
+A task launched for a match has MATCH_ID set and starts the server right
+away. A warm pool task (see common/python/warm_pool.py) has none: it waits
+until mm_onmatchfound claims its entry of WARM_POOL_TABLE, then starts the
+server with the match id of the claim. A retired or forgotten entry means the
+pool was scaled down, the task exits.
+
+With SLOTS_PER_TASK above one the task hosts several matches (see
+common/python/placement.py). The agent then starts a server for each match
+written in the task's entry of SERVER_TASKS_TABLE, with PORT set to the port
+of its slot, gives the slot back when that server exits, and stops the task
+once it has hosted nothing for IDLE_TIMEOUT.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import boto3
+from botocore.exceptions import ClientError
+
+SERVER = ['timeout', '20m', './DuoBoloServer']
+WARM_POOL_TABLE = os.environ.get("WARM_POOL_TABLE")
+# seconds between two reads of the entry, the server starts at most this late after the claim
+CLAIM_POLL_INTERVAL = float(os.environ.get("CLAIM_POLL_INTERVAL", "0.5"))
+# the entry is written once run_task returns, a missing entry is only final after this many seconds
+ENTRY_GRACE = 60
+
+SERVER_TASKS_TABLE = os.environ.get("SERVER_TASKS_TABLE")
+SLOTS_PER_TASK = int(os.environ.get("SLOTS_PER_TASK", "1"))
+BASE_PORT = 13333
+# seconds between two heartbeats, placement skips a task silent for 90
+HEARTBEAT_INTERVAL = 30
+# seconds a task hosting no match waits for one before it stops
+IDLE_TIMEOUT = 300
+
+
+def start_server(match_id):
+    print(f"Starting server for match {match_id}", flush=True)
+    os.execvpe(SERVER[0], SERVER, {**os.environ, 'MATCH_ID': match_id})
+
+
+def task_id():
+    with urllib.request.urlopen(os.environ['ECS_CONTAINER_METADATA_URI_V4'] + '/task') as response:
+        return json.load(response)['TaskARN'].split('/')[-1]
+
+
+def main():
+    if SLOTS_PER_TASK > 1:
+        host(task_id())
+
+    if os.environ.get('MATCH_ID'):
+        start_server(os.environ['MATCH_ID'])
+
+    table = boto3.resource('dynamodb').Table(WARM_POOL_TABLE)
+    key = {'taskId': task_id()}
+    print(f"Waiting for a match as pool task {key['taskId']}", flush=True)
+    started = time.monotonic()
+
+    while True:
+        try:
+            item = table.get_item(Key=key, ConsistentRead=True).get('Item')
+        except Exception as e:
+            print(f"Error reading pool entry {e}", flush=True)
+            time.sleep(CLAIM_POLL_INTERVAL)
+            continue
+
+        if item is None and time.monotonic() - started < ENTRY_GRACE:
+            time.sleep(CLAIM_POLL_INTERVAL)
+            continue
+        if item is None or item['status'] == 'retired':
+            print("Pool task retired", flush=True)
+            sys.exit(0)
+        if item['status'] == 'claimed':
+            start_server(item['matchId'])
+        time.sleep(CLAIM_POLL_INTERVAL)
+
+
+# Run a server per match of the task entry, until the task hosted nothing for IDLE_TIMEOUT
+def host(task):
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table(SERVER_TASKS_TABLE)
+    pool = dynamodb.Table(WARM_POOL_TABLE)
+    key = {'taskId': task}
+    print(f"Hosting up to {SLOTS_PER_TASK} matches as task {task}", flush=True)
+
+    # slot -> (match id, server process), and the slots of servers that exited, not released yet
+    servers = {}
+    ended = {}
+    started = last_heartbeat = idle_since = time.monotonic()
+    while True:
+        try:
+            item = table.get_item(Key=key, ConsistentRead=True).get('Item')
+            now = time.monotonic()
+            if item is None:
+                # a pool task before its claim
+                entry = pool.get_item(Key=key, ConsistentRead=True).get('Item')
+                if (entry is None and now - started >= ENTRY_GRACE) or (entry and entry['status'] == 'retired'):
+                    print("Pool task retired", flush=True)
+                    sys.exit(0)
+                time.sleep(CLAIM_POLL_INTERVAL)
+                continue
+
+            for slot, match_id in item.get('matches', {}).items():
+                slot = int(slot)
+                # a slot released by the match result may be given again before its server exits
+                if slot not in servers and ended.get(slot) != match_id:
+                    print(f"Starting server for match {match_id} on port {BASE_PORT + slot}", flush=True)
+                    servers[slot] = (match_id, subprocess.Popen(
+                        SERVER, env={**os.environ, 'MATCH_ID': match_id, 'PORT': str(BASE_PORT + slot)}))
+
+            for slot, (match_id, process) in list(servers.items()):
+                if process.poll() is not None:
+                    del servers[slot]
+                    ended[slot] = match_id
+
+            for slot, match_id in list(ended.items()):
+                release(table, key, slot, match_id)
+                del ended[slot]
+
+            if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                table.update_item(
+                    Key=key,
+                    UpdateExpression='SET heartbeat = :now',
+                    ExpressionAttributeValues={':now': int(time.time())}
+                )
+                last_heartbeat = now
+
+            if servers:
+                idle_since = now
+            elif now - idle_since >= IDLE_TIMEOUT and close(table, key):
+                print("No match to host, stopping", flush=True)
+                sys.exit(0)
+        except Exception as e:
+            print(f"Error updating task entry {e}", flush=True)
+        time.sleep(CLAIM_POLL_INTERVAL)
+
+
+# Give the slot back, unless the match result already did
+def release(table, key, slot, match_id):
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression='ADD free :slots, used :minus_one REMOVE matches.#slot',
+            ConditionExpression='matches.#slot = :match',
+            ExpressionAttributeNames={'#slot': str(slot)},
+            ExpressionAttributeValues={':slots': {slot}, ':minus_one': -1, ':match': match_id}
+        )
+        print(f"Released slot {slot} of match {match_id}", flush=True)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+# Stop taking matches, False if one was placed meanwhile
+def close(table, key):
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET #status = :closed',
+            ConditionExpression='#status = :open AND used = :zero',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':open': 'open', ':closed': 'closed', ':zero': 0}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,52 @@
 import json
-import jwt
-from jwt import ExpiredSignatureError, DecodeError
-from jwt import PyJWKClient
-import requests
 import os
-import base64
-import boto3
-
-# Set up your Cognito pool data
-COGNITO_USER_POOL_ID = os.environ.get("COGNITO_USER_POOL_ID")
-COGNITO_REGION = os.environ.get("COGNITO_REGION")
-COGNITO_APP_CLIENT_ID = os.environ.get("COGNITO_USER_POOL_CLIENT_ID")
-COGNITO_POOL_ISSUER = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
+
+import aws_clients
+import cognito_verifier
+import ticket_queue
+import ticket_registry
+from ttl_cache import TtlCache
+
 PLAYER_STORAGE_TABLE_NAME = os.environ.get("PLAYER_STORAGE_TABLE")
+# skill inputs of players seen by this container, so a reconnect loop skips the read.
+# The first connect after a match result reads the profile again, ticket_registry tells which one it is.
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", "30"))
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "1024"))
+# only what the skill needs, not the achievements
+PROFILE_PROJECTION = "username, totalCubesDropped, matchCount"
 
-# Fetch Cognito Pool public keys dynamically (public keys used to validate JWT)
-def get_cognito_public_keys():
-    url = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()['keys']
-    else:
-        raise Exception("Unable to fetch Cognito public keys")
 
+profile_cache = TtlCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
 
-# Validate JWT token
-def validate_jwt(token):
-    unverified_header = jwt.get_unverified_header(token)
-    if unverified_header is None or 'kid' not in unverified_header:
-        raise Exception("Authorization malformed")
 
-    url = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json"
-    jwks_client = PyJWKClient(url, headers=unverified_header)
-    rsa_key = jwks_client.get_signing_key_from_jwt(token)
+# Skill inputs of a player, None if the player is not in the database. A fresh read skips the cache
+# and is consistent, it sees a match result posted just before
+def get_profile(table, username, fresh=False):
+    profile = profile_cache.get(username) if not fresh else None
+    if profile is not None:
+        return profile
 
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=['RS256'],
-                audience=COGNITO_APP_CLIENT_ID,
-                issuer=COGNITO_POOL_ISSUER
-            )
-            return payload
-        except ExpiredSignatureError:
-            raise Exception("Token is expired")
-        except DecodeError:
-            raise Exception("Unable to decode token")
-    else:
-        raise Exception("Unable to find appropriate key")
+    response = table.get_item(
+        Key={
+            'username': username
+        },
+        ProjectionExpression=PROFILE_PROJECTION,
+        ConsistentRead=fresh
+    )
+
+    if 'Item' not in response:
+        profile_cache.invalidate(username)
+        return None
 
+    profile = response['Item']
+    profile_cache.put(username, profile)
+    return profile
+
+
+# Validate JWT token
+def validate_jwt(token):
+    return cognito_verifier.verify_token(token)
 
-MATCHMAKING_CONFIG_NAME = os.environ.get("MATCHMAKING_CONFIG_NAME")
 
 
 def lambda_handler(event, context):
@@ -74,73 +68,70 @@ def lambda_handler(event, context):
     try:
         # Validate the JWT token using the Cognito public key
         payload = validate_jwt(token)
+    except Exception as e:
+        print(e)
+        return {
+            'statusCode': 401,
+            'body': json.dumps('Unauthorized')
+        }
 
-        # If we reach here, the token is valid
-        client = boto3.client('gamelift')
-
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(PLAYER_STORAGE_TABLE_NAME)
+    # If we reach here, the token is valid
+    username = payload['cognito:username']
+    connection_id = event['requestContext']['connectionId']
 
-        # Check if the user exists in the database
-        response = table.get_item(
-            Key={
-                'username': payload['cognito:username']
+    try:
+        # A player still queued from a previous connection keeps their ticket and its wait time
+        ticket_id, result_posted = ticket_registry.reattach(username, connection_id)
+        if ticket_id is not None:
+            print(f"Reattached {username} to ticket {ticket_id}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Connected',
+                    'user': username,
+                    'status': 'queued',
+                    'reattached': True
+                })
             }
-        )
 
-        print(response)
+        table = aws_clients.table(PLAYER_STORAGE_TABLE_NAME)
+
+        # Check if the user exists in the database
+        user_data = get_profile(table, username, fresh=result_posted)
 
-        if 'Item' not in response:
+        if user_data is None:
             return {
                 'statusCode': 401,
                 'body': json.dumps('Unauthorized')
             }
 
-        user_data = response['Item']
-
         # Get mmr (cubes dropped / matches played)
         mmr = user_data['totalCubesDropped'] / user_data['matchCount'] if user_data['matchCount'] > 0 else 0
 
-        ticket_id = base64.b16encode(event['requestContext']['connectionId'].encode('utf-8')).decode('utf-8')
-        response = client.start_matchmaking(
-            TicketId=ticket_id,
-            ConfigurationName=MATCHMAKING_CONFIG_NAME,
-            Players=[
-                {
-                    'PlayerId': payload['cognito:username'],
-                    'PlayerAttributes': {
-                        'skill': {
-                            'N': int(mmr) # TODO RETRIEVE FROM DB
-                        }
-                    }
-                    # 'Team': 'red'
-                },
-            ]
-        )
-
-        if response['ResponseMetadata']['HTTPStatusCode'] != 200:
-            return {
-                'statusCode': 500,
-                'body': json.dumps('Failed to start matchmaking')
-            }
-
-        # ticket = response['MatchmakingTicket']
-        # # remove StartTime and EndTime from the ticket
-        # ticket.pop('StartTime', None)
-        # ticket.pop('EndTime', None)
+        # The ticket is queued and started by mm_submitticket at the rate GameLift allows,
+        # registered first so it can be reattached and is not started once the player left
+        ticket_id = ticket_registry.ticket_id_for(connection_id)
+        if ticket_registry.register(username, ticket_id, connection_id):
+            # a result posted since the reattach, this ticket keeps the skill read above but the next one reads it again
+            profile_cache.invalidate(username)
+        try:
+            ticket_queue.submit(ticket_id, username, connection_id, int(mmr))
+        except Exception:
+            ticket_registry.release_connection(username, connection_id)
+            raise
 
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Connected',
-                'user': payload['cognito:username']#,
-                # 'matchmaking_ticket': ticket
+                'user': username,
+                'status': 'queued'
             })
         }
     except Exception as e:
+        # not an auth failure, the client can retry later without a new token
         print(e)
         return {
-            'statusCode': 401,
-            'body': json.dumps('Unauthorized')
+            'statusCode': 503,
+            'body': json.dumps('Failed to start matchmaking')
         }
-
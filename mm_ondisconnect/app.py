@@ -1,6 +1,10 @@
-import base64
 import json
-import boto3
+import os
+import aws_clients
+import ticket_registry
+from botocore.exceptions import ClientError
+
+DISCONNECT_QUEUE_URL = os.environ.get("DISCONNECT_QUEUE_URL")
 
 
 def lambda_handler(event, context):
@@ -25,13 +29,44 @@ def lambda_handler(event, context):
         Return doc: https://docs.aws.amazon.com/apigateway/latest/developerguide/set-up-lambda-proxy-integrations.html
     """
 
-    ticket_id = base64.b16encode(event['requestContext']['connectionId'].encode('utf-8')).decode('utf-8')
+    connection_id = event['requestContext']['connectionId']
+
+    client = aws_clients.client('gamelift')
 
-    client = boto3.client("gamelift")
+    player_id = ticket_registry.find_player(connection_id)
+    if player_id is None:
+        # the index can lag behind a connection made moments ago, the ticket this connection started names its player
+        tickets = client.describe_matchmaking(
+            TicketIds=[ticket_registry.ticket_id_for(connection_id)]
+        )['TicketList']
+        if tickets:
+            player_id = tickets[0]['Players'][0]['PlayerId']
 
-    response = client.stop_matchmaking(
-        TicketId=ticket_id
-    )
+    # The client usually reconnects after this, the ticket waits for it and mm_releaseticket stops it if it does not
+    ticket_id = ticket_registry.detach(player_id, connection_id) if player_id else None
+    if ticket_id is not None:
+        try:
+            aws_clients.client('sqs').send_message(
+                QueueUrl=DISCONNECT_QUEUE_URL,
+                MessageBody=json.dumps({
+                    'playerId': player_id,
+                    'ticketId': ticket_id,
+                    'connectionId': connection_id
+                }),
+                DelaySeconds=ticket_registry.RECONNECT_GRACE
+            )
+            print(f"Ticket {ticket_id} of {player_id} waits {ticket_registry.RECONNECT_GRACE} s for a reconnect")
+        except Exception as e:
+            print(f"Error queueing release of ticket {ticket_id}: {e}, stopping it now")
+            # Only stop the ticket if the player did not reconnect to it from another connection
+            if ticket_registry.release_connection(player_id, connection_id) is not None:
+                try:
+                    client.stop_matchmaking(
+                        TicketId=ticket_id
+                    )
+                except ClientError as e:
+                    # still queued, mm_submitticket drops it since it is no longer registered
+                    print(f"Error stopping ticket {ticket_id}: {e}")
 
     return {
         'statusCode': 200,
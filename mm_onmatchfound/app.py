@@ -1,9 +1,15 @@
 import time
 from datetime import datetime, timedelta
+import hashlib
 import json
-import boto3
+import aws_clients
 import os
-import base64
+import placement
+import ticket_registry
+import warm_pool
+from boto3.dynamodb.conditions import Key
+from broadcaster import Broadcaster
+from concurrent.futures import ThreadPoolExecutor
 
 region = os.environ['REGION']
 websocket_api_id = os.environ['WEBSOCKET_API_ID']
@@ -14,60 +20,178 @@ subnet_a = os.environ['SUBNET_A']
 subnet_b = os.environ['SUBNET_B']
 security_group = os.environ['SECURITY_GROUP']
 matches_table = os.environ.get("MATCHES_TABLE")
+MATCH_INDEX = 'matchId-index'
+# maxReceiveCount of the match found queue, the last delivery cancels a match that still got no task
+MAX_RECEIVES = int(os.environ.get("MAX_RECEIVES", "3"))
+# matches of a batch started at once
+workers = int(os.environ.get("WORKERS", "8"))
+
+# run_task starts at most this many tasks per call
+RUN_TASK_MAX_COUNT = 10
+
+executor = ThreadPoolExecutor(max_workers=workers)
 
 def lambda_handler(event, context):
-    message = json.loads(event['Records'][0]['Sns']['Message'])
+    # every record of the batch, not only the first
+    matches = []
+    message_ids = {}
+    receives = {}
+    for record in event['Records']:
+        if 'Sns' in record:
+            message = json.loads(record['Sns']['Message'])
+        else:
+            # from the match found queue, the body is the notification of the topic
+            message = json.loads(json.loads(record['body'])['Message'])
+            message_ids[message['detail']['matchId']] = record['messageId']
+            receives[message['detail']['matchId']] = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
 
-    # ensure message is match succeeded
-    if message['detail']['type'] != 'MatchmakingSucceeded':
-        return
+        # ensure message is match succeeded
+        if message['detail']['type'] == 'MatchmakingSucceeded':
+            matches.append(message['detail'])
 
-    tickets = message["detail"]["tickets"]
-    match_id = message["detail"]["matchId"]
+    # a message delivered again after its match was recorded, by a retry of the batch or by SQS itself
+    recorded = list(executor.map(is_recorded, [detail['matchId'] for detail in matches]))
+    for detail, done in zip(matches, recorded):
+        if done:
+            print(f"Match {detail['matchId']} already recorded")
+    matches = [detail for detail, done in zip(matches, recorded) if not done]
 
-    print(f"Starting {task} on {cluster} for match {match_id}")
+    if not matches:
+        return {'batchItemFailures': []}
+
+    # messages of the matches that failed, only these are delivered again
+    failures = []
+
+    # a slot or a pool task for each match, then a new task for the rest, launched together
+    assignments = list(executor.map(assign, matches))
+    waiting = [detail['matchId'] for detail, assignment in zip(matches, assignments) if assignment is None]
+    if waiting:
+        launched = launch_tasks(aws_clients.client('ecs'), waiting)
+        started = []
+        for detail, assignment in zip(matches, assignments):
+            match_id = detail['matchId']
+            if assignment is None and match_id in launched:
+                assignment = (launched[match_id], 0, None, False)
+            elif assignment is None and receives.get(match_id, MAX_RECEIVES) < MAX_RECEIVES:
+                # ECS had no capacity for it, the match is tried again once the message is delivered again
+                print(f"No task for match {match_id}, retrying")
+                failures.append(message_ids[match_id])
+                continue
+            started.append((detail, assignment))
+        matches = [detail for detail, _ in started]
+        assignments = [assignment for _, assignment in started]
+
+    found = []
+    cancelled = []
+    # players of the matches on a task already running, with its IP and the port of the match
+    ready = []
+    for detail, result in zip(matches, executor.map(try_start_match, matches, assignments)):
+        if result is None:
+            if detail['matchId'] in message_ids:
+                failures.append(message_ids[detail['matchId']])
+            continue
+
+        players, match_launched, server_ip, port = result
+        connection_ids = [player["connectionId"] for player in players]
+        if match_launched:
+            found += connection_ids
+            if server_ip:
+                ready.append((connection_ids, server_ip, port))
+        else:
+            cancelled += connection_ids
+
+    # notify every player at once
+    broadcaster = Broadcaster(websocket_api_id, region, stage)
+    if found:
+        outcomes = broadcaster.post(found, {'status': 'found'})
+        print(f"Notified players of the launched matches: {outcomes}")
+        for connection_id, e in outcomes.failed.items():
+            print(f"Error on ticket {connection_id}: {e}")
+    # no RUNNING event comes for a task already running, send its IP now
+    for connection_ids, server_ip, port in ready:
+        outcomes = broadcaster.post(connection_ids, {'status': 'server_started', 'ip': server_ip, 'port': port})
+        print(f"Notified players of server {server_ip}:{port}: {outcomes}")
+    if cancelled:
+        outcomes = broadcaster.delete(cancelled)
+        print(f"Closed connections of cancelled matches: {outcomes}")
+        for connection_id, e in outcomes.failed.items():
+            print(f"Error on ticket {connection_id}: {e}")
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]
+    }
+
+# Whether the match was recorded already, then its task runs and its players were told
+def is_recorded(match_id):
+    response = aws_clients.table(matches_table).query(
+        IndexName=MATCH_INDEX,
+        KeyConditionExpression=Key('matchId').eq(match_id),
+        Limit=1
+    )
+    return bool(response['Items'])
+
+# start_match, or None if it failed before the match was recorded, its task or slot is given up for the retry
+def try_start_match(detail, assignment):
+    try:
+        return start_match(detail, assignment)
+    except Exception as e:
+        print(f"Error starting match {detail['matchId']}: {e}")
+        if assignment:
+            task_id, slot, _, placed = assignment
+            give_up(aws_clients.client('ecs'), task_id, slot, detail['matchId'], placed)
+        return None
 
-    # launch a task
-    ecs = boto3.client('ecs')
+# A task running already for the match, returns (task id, slot, server IP, whether placed in a slot) or None
+def assign(detail):
+    match_id = detail["matchId"]
+
+    # counted for the warm pool size
+    try:
+        warm_pool.record_match()
+    except Exception as e:
+        print(f"Error recording match {e}")
+
+    # a free slot of a running task first, a new task only when they are all full
+    if placement.enabled():
+        try:
+            placed = placement.place(match_id)
+            if placed:
+                task_id, slot, server_ip = placed
+                print(f"Match {match_id} placed in slot {slot} of task {task_id}")
+                return task_id, slot, server_ip, True
+        except Exception as e:
+            print(f"Error placing match {e}")
+
+    # a pool task already runs, its claim agent starts the server with the match id
+    try:
+        claimed = warm_pool.claim(match_id)
+        if claimed:
+            print(f"Match {match_id} claimed pool task {claimed['taskId']}")
+            return claimed['taskId'], 0, claimed['ip'], False
+    except Exception as e:
+        print(f"Error claiming a pool task {e}")
+
+    return None
+
+# Record the match on its task, returns its players, whether it launched, the server IP if already known and its port
+def start_match(detail, assignment):
+    tickets = detail["tickets"]
+    match_id = detail["matchId"]
+
+    ecs = aws_clients.client('ecs')
 
     task_id = ""
+    server_ip = None
+    slot = 0
+    placed = False
 
     match_launched = False
-    try:
-        response = ecs.run_task(
-            cluster=cluster,
-            count=1,
-            enableECSManagedTags=True,
-            startedBy='mm_onmatchfound',
-            taskDefinition=task,
-            clientToken=match_id,
-            overrides={
-              'containerOverrides': [
-                  {
-                      'name': 'container',
-                      'environment': [
-                          {
-                              'name': 'MATCH_ID',
-                              'value': match_id
-                          },
-                      ],
-                  },
-              ]
-            },
-            networkConfiguration={
-                'awsvpcConfiguration': {
-                    'subnets': [subnet_a, subnet_b],
-                    'securityGroups': [security_group],
-                    'assignPublicIp': 'ENABLED'
-                }
-            },
-        )
 
-        task_arn = response['tasks'][0]['taskArn']
-        task_id = task_arn.split('/')[-1]
+    if assignment:
+        task_id, slot, server_ip, placed = assignment
         match_launched = True
-    except Exception as e:
-        print(f"Error launching task {e}, cancelling tickets")
+    else:
+        print(f"No task for match {match_id}, cancelling tickets")
 
     # add match to matches table
     # match : { "Players": [ { "connection": CONNECTION_ID, "ticket": TICKET_ID } ], "TTLAttrib": CREATION_TIME_PLUS_1HOUR }
@@ -75,22 +199,28 @@ def lambda_handler(event, context):
     players = []
     for ticket in tickets:
         ticket_id = ticket["ticketId"]
+        player_id = ticket["players"][0]["playerId"]
 
-        connection_id = base64.b16decode(ticket_id.encode('utf-8')).decode('utf-8')
+        # the player may have reconnected since the ticket started
+        connection_id = ticket_registry.resolve_connection(player_id, ticket_id)
+        ticket_registry.remove(player_id, ticket_id)
         players += [
             {
                 'connectionId': connection_id,
                 'ticketId': ticket_id,
-                'playerId': ticket["players"][0]["playerId"],
+                'playerId': player_id,
             }
         ]
 
-    dynamo = boto3.resource('dynamodb')
-    table = dynamo.Table(matches_table)
+    table = aws_clients.table(matches_table)
 
     # add match to matches table
     try:
         if match_launched:
+            # the new task hosts the match in its first slot
+            if placement.enabled() and not placed:
+                placement.register(task_id, match_id, server_ip)
+
             current_time = int(datetime.now().timestamp())
             expiration_time = int((datetime.now() + timedelta(hours=2)).timestamp())
 
@@ -98,6 +228,7 @@ def lambda_handler(event, context):
                 Item={
                     'matchId': match_id,
                     'taskId': task_id,
+                    'port': placement.port(slot),
                     'creationTime': current_time,
                     'expirationTime': expiration_time,  # 1 hour from now
                     'players': players
@@ -106,36 +237,127 @@ def lambda_handler(event, context):
     except Exception as e:
         print(f"Error adding match to table {e}")
         if match_launched:
-            # cancel task
-            try:
-                # wait for 2 seconds
-                print("Waiting for 2 seconds before stopping task")
-                time.sleep(2)
-                response = ecs.stop_task(
-                    cluster=cluster,
-                    task=task_id,
-                    reason='Matchmaking failed'
-                )
-                print(f"Stopped task {task_id}: {response}")
-            except Exception as e:
-                print(f"Error stopping task {e}")
+            give_up(ecs, task_id, slot, match_id, placed)
 
         match_launched = False
 
-    for player in players:
-        connection_id = player["connectionId"]
+    # mm_onmatchrunning records the IP before it reads the matches of the task. Read once the match is
+    # recorded, either the IP is there and the players are notified here, or the RUNNING event sees the match
+    if placement.enabled() and match_launched and not server_ip:
+        try:
+            server_ip = placement.ip_of(task_id)
+        except Exception as e:
+            print(f"Error reading task IP {e}")
+
+    return players, match_launched, server_ip, placement.port(slot)
 
-        print(f"Canceling connection {connection_id}")
-        gateway = boto3.client('apigatewaymanagementapi', endpoint_url=f'https://{websocket_api_id}.execute-api.{region}.amazonaws.com/{stage}')
+# The match will not run on its task, stop the task or give the slot back
+def give_up(ecs, task_id, slot, match_id, placed):
+    if placed:
+        # the task hosts other matches, only give the slot back
         try:
-            if match_launched:
-                gateway.post_to_connection(
-                    ConnectionId=connection_id,
-                    Data=json.dumps({'status': 'found'})
-                )
-            else:
-                gateway.delete_connection(
-                    ConnectionId=connection_id
-                )
+            placement.release(task_id, slot, match_id)
         except Exception as e:
-            print(f"Error on ticket {connection_id}: {e}")
\ No newline at end of file
+            print(f"Error releasing slot {e}")
+        return
+
+    # cancel task
+    try:
+        # wait for 2 seconds
+        print("Waiting for 2 seconds before stopping task")
+        time.sleep(2)
+        response = ecs.stop_task(
+            cluster=cluster,
+            task=task_id,
+            reason='Matchmaking failed'
+        )
+        print(f"Stopped task {task_id}: {response}")
+    except Exception as e:
+        print(f"Error stopping task {e}")
+
+# Start a task per match, up to RUN_TASK_MAX_COUNT per run_task call, returns the task id of each match launched.
+# A match missing from it got no task, ECS was out of capacity or the call failed
+def launch_tasks(ecs, match_ids):
+    launched = {}
+    for start in range(0, len(match_ids), RUN_TASK_MAX_COUNT):
+        batch = match_ids[start:start + RUN_TASK_MAX_COUNT]
+        try:
+            if len(batch) == 1:
+                launched[batch[0]] = launch_task(ecs, batch[0])
+                continue
+            task_ids = launch_batch(ecs, batch)
+        except Exception as e:
+            print(f"Error launching tasks {e}")
+            continue
+
+        # the tasks share their overrides, the claim agent of each reads its match from the warm pool table
+        for match_id, task_id in zip(batch, task_ids):
+            try:
+                warm_pool.add_claimed(task_id, match_id)
+                launched[match_id] = task_id
+            except Exception as e:
+                # the task would wait for a match that never comes
+                print(f"Error giving task {task_id} to match {match_id} {e}")
+                give_up(ecs, task_id, 0, match_id, False)
+    return launched
+
+# Start len(match_ids) tasks in one call, returns their ids, fewer if ECS could not place them all
+def launch_batch(ecs, match_ids):
+    print(f"Starting {len(match_ids)} {task} on {cluster} for matches {match_ids}")
+
+    response = ecs.run_task(
+        cluster=cluster,
+        count=len(match_ids),
+        enableECSManagedTags=True,
+        startedBy='mm_onmatchfound',
+        taskDefinition=task,
+        # same batch on a retry of the same messages
+        clientToken=hashlib.sha256(','.join(match_ids).encode()).hexdigest()[:64],
+        networkConfiguration={
+            'awsvpcConfiguration': {
+                'subnets': [subnet_a, subnet_b],
+                'securityGroups': [security_group],
+                'assignPublicIp': 'ENABLED'
+            }
+        },
+    )
+
+    for failure in response.get('failures', []):
+        print(f"Error launching task: {failure}")
+    return [started['taskArn'].split('/')[-1] for started in response['tasks']]
+
+# Start a task for the match, returns its id
+def launch_task(ecs, match_id):
+    print(f"Starting {task} on {cluster} for match {match_id}")
+
+    response = ecs.run_task(
+        cluster=cluster,
+        count=1,
+        enableECSManagedTags=True,
+        startedBy='mm_onmatchfound',
+        taskDefinition=task,
+        clientToken=match_id,
+        overrides={
+          'containerOverrides': [
+              {
+                  'name': 'container',
+                  'environment': [
+                      {
+                          'name': 'MATCH_ID',
+                          'value': match_id
+                      },
+                  ],
+              },
+          ]
+        },
+        networkConfiguration={
+            'awsvpcConfiguration': {
+                'subnets': [subnet_a, subnet_b],
+                'securityGroups': [security_group],
+                'assignPublicIp': 'ENABLED'
+            }
+        },
+    )
+
+    task_arn = response['tasks'][0]['taskArn']
+    return task_arn.split('/')[-1]
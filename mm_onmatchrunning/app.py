@@ -1,7 +1,9 @@
-import json
-import boto3
+import aws_clients
 import os
 import time
+import placement
+import warm_pool
+from broadcaster import Broadcaster
 
 matches_table = os.environ['MATCHES_TABLE']
 region = os.environ['REGION']
@@ -17,7 +19,7 @@ def lambda_handler(event, context):
     print(f"Task ID: {task_id}")
 
     # get task ip
-    ecs = boto3.client('ecs')
+    ecs = aws_clients.client('ecs')
     response = ecs.describe_tasks(
         cluster=os.environ['CLUSTER'],
         tasks=[task_id]
@@ -25,7 +27,7 @@ def lambda_handler(event, context):
     task = response['tasks'][0]
     eni = task['attachments'][0]['details'][1]['value']
 
-    ec2 = boto3.client('ec2')
+    ec2 = aws_clients.client('ec2')
 
     # delay to allow for IP address assignment
     time.sleep(2)
@@ -37,35 +39,41 @@ def lambda_handler(event, context):
     interface = response['NetworkInterfaces'][0]
     ip_address = interface['Association']['PublicIp']
 
-    # get player connections
-    dynamodb = boto3.client('dynamodb')
+    # a pool task waits for a match, mm_onmatchfound gives its IP to the players
+    if event['detail'].get('startedBy') == warm_pool.POOL_STARTED_BY:
+        if warm_pool.mark_idle(task_id, ip_address):
+            print(f"Pool task {task_id} is idle at {ip_address}")
+        return
 
-    response = dynamodb.get_item(
+    # before the matches are read, a match recorded after the query gets the IP from mm_onmatchfound
+    if placement.enabled():
+        placement.set_ip(task_id, ip_address)
+
+    # get player connections, of every match the task hosts
+    dynamodb = aws_clients.client('dynamodb')
+
+    response = dynamodb.query(
         TableName=matches_table,
-        Key={
-            'taskId': {
+        KeyConditionExpression='taskId = :taskId',
+        ExpressionAttributeValues={
+            ':taskId': {
                 'S': task_id
             }
-        }
+        },
+        ConsistentRead=True
     )
 
-    # for each players in Players
-    players = response['Item']['players']['L']
-
-    gateway = boto3.client('apigatewaymanagementapi', endpoint_url=f"https://{websocket_api_id}.execute-api.{region}.amazonaws.com/{stage}")
-
-    for player in players:
-        try:
-            connection_id = player['M']['connectionId']['S']
+    # send message to every player at once
+    broadcaster = Broadcaster(websocket_api_id, region, stage)
+    for match in response['Items']:
+        players = match['players']['L']
+        port = int(match['port']['N'])
+        outcomes = broadcaster.post([player['M']['connectionId']['S'] for player in players], {
+            'status': 'server_started',
+            'ip': ip_address,
+            'port': port
+        })
 
-            # send message to player
-            response = gateway.post_to_connection(
-                ConnectionId=connection_id,
-                Data=json.dumps({
-                    'status': 'server_started',
-                    'ip': ip_address
-                })
-            )
-            print(f"Message sent to player {connection_id}: {response}")
-        except Exception as e:
-            print(f"Error sending message to player: {e}")
+        print(f"Messages sent to players of task {task_id} port {port}: {outcomes}")
+        for connection_id, e in outcomes.failed.items():
+            print(f"Error sending message to player {connection_id}: {e}")
@@ -1,36 +1,46 @@
 import json
-import boto3
 import os
-import base64
+import ticket_registry
+from broadcaster import Broadcaster
+from concurrent.futures import ThreadPoolExecutor
 
 region = os.environ['REGION']
 websocket_api_id = os.environ['WEBSOCKET_API_ID']
 stage = os.environ['STAGE']
+# tickets of a batch released at once
+workers = int(os.environ.get("WORKERS", "8"))
+
+executor = ThreadPoolExecutor(max_workers=workers)
 
 def lambda_handler(event, context):
-    message = json.loads(event['Records'][0]['Sns']['Message'])
+    # every record of the batch, not only the first
+    tickets = []
+    for record in event['Records']:
+        message = json.loads(record['Sns']['Message'])
+
+        # ensure the ticket was dropped. A cancelled ticket was stopped after its player left,
+        # its entry is usually gone already and removing it again is a no-op
+        if message['detail']['type'] in ['MatchmakingTimedOut', 'MatchmakingFailed', 'MatchmakingCancelled']:
+            tickets += message["detail"]["tickets"]
 
-    # ensure message is match succeeded
-    if message['detail']['type'] not in ['MatchmakingTimedOut', 'MatchmakingFailed']:
+    if not tickets:
         return
 
-    # cancel all websocket connections. Their id is the ticket id
-
-    tickets = message["detail"]["tickets"]
-
-    for ticket in tickets:
-        ticket_id = ticket["ticketId"]
-
-        connection_id = base64.b16decode(ticket_id.encode('utf-8')).decode('utf-8')
-        print(f"Canceling connection {connection_id}")
-        client = boto3.client('apigatewaymanagementapi', endpoint_url=f'https://{websocket_api_id}.execute-api.{region}.amazonaws.com/{stage}')
-        try:
-            # client.post_to_connection(
-            #     ConnectionId=connection_id,
-            #     Data=json.dumps({'status': 'found', 'event': message})
-            # )
-            client.delete_connection(
-                ConnectionId=connection_id
-            )
-        except Exception as e:
-            print(f"Error canceling ticket {connection_id}: {e}")
\ No newline at end of file
+    # cancel all websocket connections. The ticket id is the one that started it, the player may have reconnected since
+
+    connection_ids = list(executor.map(release, tickets))
+    print(f"Canceling connections {connection_ids}")
+
+    outcomes = Broadcaster(websocket_api_id, region, stage).delete(connection_ids)
+    print(f"Canceled connections: {outcomes}")
+    for connection_id, e in outcomes.failed.items():
+        print(f"Error canceling ticket {connection_id}: {e}")
+
+# Forget the ticket, returns the connection of its player
+def release(ticket):
+    ticket_id = ticket["ticketId"]
+    player_id = ticket["players"][0]["playerId"]
+
+    connection_id = ticket_registry.resolve_connection(player_id, ticket_id)
+    ticket_registry.remove(player_id, ticket_id)
+    return connection_id
@@ -0,0 +1,36 @@
+import json
+import aws_clients
+import ticket_registry
+from botocore.exceptions import ClientError
+
+
+# Messages of mm_ondisconnect, delayed by the grace period a disconnected player has to reconnect
+def lambda_handler(event, context):
+    client = aws_clients.client('gamelift')
+
+    failures = []
+    for record in event['Records']:
+        message = json.loads(record['body'])
+        player_id = message['playerId']
+        ticket_id = message['ticketId']
+
+        try:
+            if not ticket_registry.expire(player_id, ticket_id, message['connectionId']):
+                print(f"{player_id} reattached to ticket {ticket_id}")
+                continue
+
+            print(f"{player_id} did not reconnect, stopping ticket {ticket_id}")
+            client.stop_matchmaking(
+                TicketId=ticket_id
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidRequestException':
+                # matched, timed out or still queued, mm_submitticket drops it since it is no longer registered
+                print(f"Ticket {ticket_id} not stopped: {e}")
+            else:
+                print(f"Error stopping ticket {ticket_id}: {e}")
+                failures.append(record['messageId'])
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]
+    }
@@ -0,0 +1,108 @@
+import json
+import os
+import aws_clients
+import ticket_queue
+import ticket_registry
+from botocore.exceptions import ClientError
+from broadcaster import Broadcaster
+
+MATCHMAKING_CONFIG_NAME = os.environ.get("MATCHMAKING_CONFIG_NAME")
+# tickets GameLift rejected, kept for inspection
+TICKET_DEAD_LETTER_QUEUE_URL = os.environ.get("TICKET_DEAD_LETTER_QUEUE_URL")
+# the player of a rejected ticket is disconnected
+REGION = os.environ.get("REGION")
+WEBSOCKET_API_ID = os.environ.get("WEBSOCKET_API_ID")
+STAGE = os.environ.get("STAGE")
+# StartMatchmaking calls per second of one consumer, times the queue's MaximumConcurrency it stays under the account limit
+SUBMIT_RATE = float(os.environ.get("SUBMIT_RATE", "5"))
+SUBMIT_BURST = int(os.environ.get("SUBMIT_BURST", "5"))
+# stop waiting for tokens this long before the function times out, and hand the rest back to the queue
+TIMEOUT_MARGIN_MS = 1000
+
+bucket = ticket_queue.TokenBucket(SUBMIT_RATE, SUBMIT_BURST)
+
+
+def lambda_handler(event, context):
+    client = aws_clients.client('gamelift')
+
+    failures = []
+    throttled = False
+    for record in event['Records']:
+        # once throttled, the rest of the batch would be too, it is retried after the visibility timeout
+        if throttled:
+            failures.append(record['messageId'])
+            continue
+
+        ticket = json.loads(record['body'])
+
+        # the player disconnected while the ticket was queued
+        if not ticket_registry.is_active(ticket['playerId'], ticket['ticketId']):
+            print(f"Dropping ticket {ticket['ticketId']}, no longer active")
+            continue
+
+        timeout = (context.get_remaining_time_in_millis() - TIMEOUT_MARGIN_MS) / 1000
+        if not bucket.acquire(timeout=timeout):
+            failures.append(record['messageId'])
+            continue
+
+        try:
+            client.start_matchmaking(
+                TicketId=ticket['ticketId'],
+                ConfigurationName=MATCHMAKING_CONFIG_NAME,
+                Players=[
+                    {
+                        'PlayerId': ticket['playerId'],
+                        'PlayerAttributes': {
+                            'skill': {
+                                'N': ticket['skill']
+                            }
+                        }
+                    },
+                ]
+            )
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'ThrottlingException':
+                throttled = True
+                failures.append(record['messageId'])
+            elif code == 'InvalidRequestException':
+                try:
+                    if is_started(client, ticket['ticketId']):
+                        # a redelivered message whose ticket was already started
+                        print(f"Ticket {ticket['ticketId']} already started")
+                    else:
+                        print(f"Ticket {ticket['ticketId']} rejected: {e}")
+                        reject(record['body'], ticket)
+                except Exception as e:
+                    print(f"Error handling rejected ticket {ticket['ticketId']}: {e}")
+                    failures.append(record['messageId'])
+            else:
+                print(f"Error starting ticket {ticket['ticketId']}: {e}")
+                failures.append(record['messageId'])
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]
+    }
+
+
+# Whether GameLift knows the ticket, it does when a redelivered message started it already
+def is_started(client, ticket_id):
+    tickets = client.describe_matchmaking(
+        TicketIds=[ticket_id]
+    )['TicketList']
+    return len(tickets) > 0
+
+
+# GameLift will not start the ticket, retrying would not help. The message goes to the dead letter queue,
+# then the ticket is forgotten and its player disconnected, as for a ticket that failed in matchmaking
+def reject(body, ticket):
+    aws_clients.client('sqs').send_message(
+        QueueUrl=TICKET_DEAD_LETTER_QUEUE_URL,
+        MessageBody=body
+    )
+
+    connection_id = ticket_registry.resolve_connection(ticket['playerId'], ticket['ticketId'])
+    ticket_registry.remove(ticket['playerId'], ticket['ticketId'])
+
+    outcomes = Broadcaster(WEBSOCKET_API_ID, REGION, STAGE).delete([connection_id])
+    print(f"Canceled connection of rejected ticket {ticket['ticketId']}: {outcomes}")
@@ -0,0 +1,71 @@
+import os
+import warm_pool
+
+cluster = os.environ['CLUSTER']
+task = os.environ['LAUNCH_TASK']
+subnet_a = os.environ['SUBNET_A']
+subnet_b = os.environ['SUBNET_B']
+security_group = os.environ['SECURITY_GROUP']
+# run_task starts at most this many tasks per call
+RUN_TASK_MAX_COUNT = 10
+
+def lambda_handler(event, context):
+    ecs = warm_pool.client()
+
+    # pool tasks ECS still runs or is starting
+    live = set()
+    kwargs = {}
+    while True:
+        response = ecs.list_tasks(cluster=cluster, startedBy=warm_pool.POOL_STARTED_BY, desiredStatus='RUNNING', **kwargs)
+        live.update(arn.split('/')[-1] for arn in response['taskArns'])
+        if not response.get('nextToken'):
+            break
+        kwargs['nextToken'] = response['nextToken']
+
+    # forget the tasks that stopped before a match claimed them (spot interruption, failed start)
+    available = {}
+    for status in [warm_pool.STARTING, warm_pool.IDLE]:
+        for entry in warm_pool.entries(status):
+            if entry['taskId'] in live:
+                available[entry['taskId']] = entry
+            else:
+                print(f"Pool task {entry['taskId']} is gone")
+                warm_pool.forget(entry['taskId'], status)
+
+    rate = warm_pool.match_rate()
+    target = warm_pool.target_size(rate)
+    print(f"{rate:.2f} matches per minute, {len(available)} pool tasks, target {target}")
+
+    missing = target - len(available)
+    while missing > 0:
+        count = min(missing, RUN_TASK_MAX_COUNT)
+        response = ecs.run_task(
+            cluster=cluster,
+            count=count,
+            enableECSManagedTags=True,
+            startedBy=warm_pool.POOL_STARTED_BY,
+            taskDefinition=task,
+            networkConfiguration={
+                'awsvpcConfiguration': {
+                    'subnets': [subnet_a, subnet_b],
+                    'securityGroups': [security_group],
+                    'assignPublicIp': 'ENABLED'
+                }
+            },
+        )
+        for started in response['tasks']:
+            warm_pool.add_starting(started['taskArn'].split('/')[-1])
+        for failure in response.get('failures', []):
+            print(f"Error launching pool task: {failure}")
+        if not response['tasks']:
+            break
+        missing -= len(response['tasks'])
+
+    # scale down, idle tasks only, oldest first
+    surplus = len(available) - target
+    idle = sorted((e for e in available.values() if e['status'] == warm_pool.IDLE), key=lambda e: e['idleSince'])
+    for entry in idle[:max(surplus, 0)]:
+        if warm_pool.retire(entry['taskId']):
+            print(f"Retiring pool task {entry['taskId']}")
+            ecs.stop_task(cluster=cluster, task=entry['taskId'], reason='Warm pool scaled down')
+            warm_pool.forget(entry['taskId'], warm_pool.RETIRED)
@@ -1,14 +1,12 @@
 import os
-import boto3
+import aws_clients
 
 # get db name from environment variable PLAYER_STORAGE_TABLE
 table_name = os.environ['PLAYER_STORAGE_TABLE']
 
 def lambda_handler(event, context):
 
-    dynamodb = boto3.resource('dynamodb')
-
-    table = dynamodb.Table(table_name)
+    table = aws_clients.table(table_name)
 
     # get the user id from the event
     user_id = event['userName']
@@ -1,11 +1,14 @@
 import json
 import os
 
-import boto3
-from boto3.dynamodb.conditions import Attr
+import aws_clients
+import placement
+import ticket_registry
+from boto3.dynamodb.conditions import Attr, Key
 
 table_name = os.environ['PLAYER_STORAGE_TABLE']
 matches_table_name = os.environ['MATCHES_TABLE']
+MATCH_INDEX = 'matchId-index'
 
 milestones = [
     10,
@@ -94,10 +97,8 @@ def lambda_handler(event, context):
 
     print(f"Match ID: {match_id}")
 
-    dynamodb = boto3.resource('dynamodb')
-
-    table = dynamodb.Table(table_name)
-    matches_table = dynamodb.Table(matches_table_name)
+    table = aws_clients.table(table_name)
+    matches_table = aws_clients.table(matches_table_name)
 
     # find the match in the matches table. matchId is not the key, so we have to scan the table
     # response = matches_table.scan(
@@ -129,6 +130,13 @@ def lambda_handler(event, context):
     #         }
     #     }
 
+    # the match is over, its slot can host another one
+    if placement.enabled():
+        try:
+            release_slot(matches_table, match_id)
+        except Exception as e:
+            print(f"Error releasing slot of match {match_id}: {e}")
+
     try:
 
         # for each player, update their database entry
@@ -154,6 +162,12 @@ def lambda_handler(event, context):
                 if r['ResponseMetadata']['HTTPStatusCode'] != 200:
                     print(f'Error updating user {player['playerId']} in database')
 
+                # the next connect of the player reads their skill again instead of a cached copy
+                try:
+                    ticket_registry.mark_result(player['playerId'])
+                except Exception as e:
+                    print(f"Error marking result of {player['playerId']}: {e}")
+
                 success_indexes = get_success_indexes(r['Attributes']['matchCount'],
                                                       r['Attributes']['totalCubesDropped'])
 
@@ -190,3 +204,14 @@ def lambda_handler(event, context):
             'Access-Control-Allow-Origin': '*'
         }
     }
+
+
+def release_slot(matches_table, match_id):
+    response = matches_table.query(
+        IndexName=MATCH_INDEX,
+        KeyConditionExpression=Key('matchId').eq(match_id)
+    )
+    for match in response['Items']:
+        slot = int(match['port']) - placement.BASE_PORT
+        if placement.release(match['taskId'], slot, match_id):
+            print(f"Released slot {slot} of task {match['taskId']}")
@@ -1,7 +1,6 @@
 import json
 import os
-import boto3
-import jwt
+import aws_clients
 
 PLAYER_STORAGE_TABLE_NAME = os.environ['PLAYER_STORAGE_TABLE']
 
@@ -27,28 +26,11 @@ def lambda_handler(event, context):
         Return doc: https://docs.aws.amazon.com/apigateway/latest/developerguide/set-up-lambda-proxy-integrations.html
     """
 
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(PLAYER_STORAGE_TABLE_NAME)
+    table = aws_clients.table(PLAYER_STORAGE_TABLE_NAME)
 
-    # retrieve jwt token from authorization header
-    if 'headers' not in event or 'Authorization' not in event['headers']:
-        return {
-            "statusCode": 400,
-            'body': json.dumps({
-                'error': 'Missing Authorization header'
-            }),
-            'headers': {
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
-
-    token = event['headers']['Authorization'].replace('Bearer ', '')
-
-    # decode jwt token
-    payload = None
-    try:
-        payload = jwt.decode(token, algorithms=['RS256'], options={"verify_signature": False})
-    except jwt.DecodeError:
+    # the CognitoAuthorizer of the route verified the token, its claims come with the request
+    claims = event.get('requestContext', {}).get('authorizer', {}).get('claims')
+    if not claims:
         return {
             "statusCode": 401,
             'body': json.dumps({
@@ -60,7 +42,7 @@ def lambda_handler(event, context):
         }
 
     # get user id from token (cognito:username)
-    user_id = payload['cognito:username']
+    user_id = claims['cognito:username']
 
     # get user data from database
     response = table.get_item(